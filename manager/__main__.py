@@ -50,7 +50,7 @@ def print_usage() -> None:
     print("  --no-lock           Skip applying packages.lock (no version/digest pinning)")
     print()
     print("Build options:")
-    print("  --no-cache          Disable S3 build cache")
+    print("  --no-cache          Disable build cache")
     print("  --platform PLAT     Build for specific platform only (amd64, arm64)")
     print("                      Default: build all platforms + multi-platform manifest")
     print()
@@ -60,6 +60,9 @@ def print_usage() -> None:
     print("Manifest options:")
     print("  --snapshot-id ID    Use snapshot ID suffix for registry tags")
     print()
+    print("Lock options:")
+    print("  --no-cache          Ignore cached package versions and digests")
+    print()
     print("Lint options:")
     print("  --format FORMAT     Output format: tty (default), json, checkstyle, sarif")
     print("  --strict            Treat warnings as errors")
@@ -733,7 +736,11 @@ def cmd_sbom(args: list[str]) -> int:
 
 def cmd_lock(args: list[str]) -> int:
     """Generate packages.lock for an image."""
-    from manager.locking import run_lock
+    from manager.locking import run_lock, clear_lookup_cache
+
+    if "--no-cache" in args:
+        args = [arg for arg in args if arg != "--no-cache"]
+        clear_lookup_cache()
 
     # Group refs by image name
     image_to_refs: dict[str, list[str]] = {}
@@ -784,7 +791,7 @@ def cmd_lock(args: list[str]) -> int:
 
 def cmd_lint(args: list[str]) -> int:
     """Lint Dockerfiles using hadolint."""
-    from manager.linting import run_lint
+    from manager.linting import run_lint_each, run_lint_many
 
     image_refs = []
     format = "tty"
@@ -825,16 +832,18 @@ def cmd_lint(args: list[str]) -> int:
             print(f"Error: {e}", file=sys.stderr)
             return 1
 
-    # Lint each image
-    failed = []
-    for image_ref in image_refs:
-        try:
-            result = run_lint(image_ref, format=format, strict=strict)
-            if result != 0:
-                failed.append(image_ref)
-        except (RuntimeError, FileNotFoundError, ValueError) as e:
-            print(f"Error: {e}", file=sys.stderr)
-            failed.append(image_ref)
+    try:
+        if format != "tty" and len(image_refs) > 1:
+            # Machine-readable formats: one hadolint run yields one report
+            if run_lint_many(image_refs, format=format, strict=strict) != 0:
+                print("\nLint issues found", file=sys.stderr)
+                return 1
+            failed = []
+        else:
+            failed = run_lint_each(image_refs, format=format, strict=strict)
+    except (RuntimeError, FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
 
     if failed:
         print(f"\nLint issues in: {', '.join(failed)}", file=sys.stderr)
@@ -910,8 +919,9 @@ def cmd_generate_ci(args: list[str]) -> int:
         image = resolver.resolve(config, image_yaml.parent)
         all_images.append(image)
 
-    # Sort by dependencies
-    sorted_images = sort_images(all_images)
+    # Sort by dependencies (reused by the generators below)
+    dependencies = extract_dependencies(all_images)
+    sorted_images = sort_images(all_images, dependencies)
 
     # Generate CI based on provider or custom template
     ci_image = ci_config.image
@@ -921,17 +931,20 @@ def cmd_generate_ci(args: list[str]) -> int:
             print("Error: --output is required when using --template", file=sys.stderr)
             return 1
         try:
-            generate_custom_ci(sorted_images, Path(template_dir), Path(output_path), artifacts=artifacts, ci_image=ci_image)
+            generate_custom_ci(
+                sorted_images, Path(template_dir), Path(output_path),
+                artifacts=artifacts, ci_image=ci_image, dependencies=dependencies,
+            )
         except FileNotFoundError as e:
             print(f"Error: {e}", file=sys.stderr)
             return 1
     elif provider == "gitlab":
         final_output = Path(output_path) if output_path else Path(".gitlab/ci/images.yml")
-        generate_gitlab_ci(sorted_images, final_output, artifacts=artifacts, ci_image=ci_image)
+        generate_gitlab_ci(sorted_images, final_output, artifacts=artifacts, ci_image=ci_image, dependencies=dependencies)
         output_path = str(final_output)
     else:  # github
         final_output = Path(output_path) if output_path else Path(".github/workflows/images.yml")
-        generate_github_ci(sorted_images, final_output, artifacts=artifacts, ci_image=ci_image)
+        generate_github_ci(sorted_images, final_output, artifacts=artifacts, ci_image=ci_image, dependencies=dependencies)
         output_path = str(final_output)
 
     print(f"Generated CI configuration: {output_path}")
@@ -1,15 +1,21 @@
 """Wrapper for buildkit (buildctl/buildkitd) binaries."""
 
+import atexit
+import errno
+import fnmatch
 import os
 import platform
 import re
+import selectors
 import shutil
 import socket
 import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
 import docker
@@ -17,6 +23,11 @@ from manager.config import get_registry_url, get_registry_auth, get_registries,
 from manager.rendering import generate_tag_report
 from docker.errors import NotFound, APIError
 
+# Process umask, read once at import time (reading it means setting it, which
+# is not safe once worker threads create files)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 # Default socket/config directory in project
 DEFAULT_BUILDKIT_DIR = Path(__file__).parent.parent / ".buildkit"
 DEFAULT_SOCKET_PATH = DEFAULT_BUILDKIT_DIR / "buildkitd.sock"
@@ -52,15 +63,136 @@ PLATFORM_ALIASES = {
     "linux/amd64": "linux/amd64",
     "linux/arm64": "linux/arm64",
 }
+_PLATFORM_ALIAS_KEYS = tuple(PLATFORM_ALIASES)
 BINFMT_IMAGE = "tonistiigi/binfmt"
 
+# Host platform, resolved once at import
+_SYSTEM = platform.system().lower()
+_MACHINE = platform.machine().lower()
+
+# Match FROM lines, capturing the image reference
+# Handles: FROM image:tag, FROM image:tag AS name, FROM image AS name
+_TAG_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+_FROM_RE = re.compile(r"^(FROM\s+)(\S+)(.*)$", re.MULTILINE | re.IGNORECASE)
+_RUN_RE = re.compile(r"^([ \t]*RUN[ \t]+)((?:[^\n]*\\\n)*[^\n]*)", re.MULTILINE | re.IGNORECASE)
+_APT_CLEANUP_RE = re.compile(
+    r"(?:[ \t]*\\\n)?[ \t]*&&[ \t]*(?:rm -rf /var/lib/apt/lists/\*|apt-get clean)(?=[ \t]*(?:\\\n|&&|$))",
+    re.MULTILINE,
+)
+
+# Layer cache for crane pull (not an image directory, see get_local_images)
+CRANE_CACHE_DIR = Path("dist") / ".crane-cache"
+
+# Default .dockerignore for build contexts without one
+DOCKERIGNORE_DEFAULTS = [
+    "image.tar",
+    "image.tar.digest",
+    "linux-*/",
+    ".image-manager.*.Dockerfile",
+    ".git/",
+    ".venv/",
+    "node_modules/",
+    "__pycache__/",
+    "*.pyc",
+]
+
+# Package manager commands and the BuildKit cache mounts that keep their
+# download caches across builds
+_APT_RE = re.compile(r"\bapt(?:-get)?\s+(?:-\S+\s+)*(?:update|install)\b")
+# Debian/Ubuntu base images delete downloaded .debs after every install
+# (docker-clean), which would leave the /var/cache/apt mount empty. The hook
+# is moved aside only for the rewritten RUN and put back at its end, so the
+# image's apt config is unchanged; both moves are allowed to fail (non-root
+# USER, no docker-clean). `apt` (unlike apt-get) also needs to be told to
+# keep downloaded packages
+_APT_HOOK_OFF = "{ mv /etc/apt/apt.conf.d/docker-clean /etc/apt/docker-clean.off 2>/dev/null || true; } && "
+_APT_HOOK_ON = " && { mv /etc/apt/docker-clean.off /etc/apt/apt.conf.d/docker-clean 2>/dev/null || true; }"
+_APT_INSTALL_CMD_RE = re.compile(r"\b(apt(?:-get)?)(?=\s+(?:-\S+\s+)*install\b)")
+_APT_KEEP_PACKAGES = r"\1 -o APT::Keep-Downloaded-Packages=true"
+CACHE_MOUNTS = [
+    (
+        _APT_RE,
+        [
+            "--mount=type=cache,target=/var/cache/apt,sharing=locked",
+            "--mount=type=cache,target=/var/lib/apt/lists,sharing=locked",
+        ],
+    ),
+    (re.compile(r"\bpip3?\s+install\b"), ["--mount=type=cache,target=/root/.cache/pip"]),
+    (re.compile(r"\bnpm\s+(?:ci|install)\b"), ["--mount=type=cache,target=/root/.npm"]),
+    (re.compile(r"\bgo\s+(?:build|install|mod)\b"), ["--mount=type=cache,target=/root/.cache/go-build"]),
+]
+
 # Build reproducibility (2026-01-01 00:00:00 UTC)
 SOURCE_DATE_EPOCH = "1767225600"
 
+# Environment passed to buildctl/crane. Only variables the tools actually need
+# (registry auth, proxies, certificates, GitHub Actions cache) are forwarded so
+# unrelated variables neither bloat the child nor leak into the build.
+_TOOL_ENV_KEYS = {
+    "PATH",
+    "HOME",
+    "USER",
+    "XDG_RUNTIME_DIR",
+    "TMPDIR",
+    "SSL_CERT_FILE",
+    "SSL_CERT_DIR",
+    "HTTP_PROXY",
+    "HTTPS_PROXY",
+    "NO_PROXY",
+    "http_proxy",
+    "https_proxy",
+    "no_proxy",
+    "GOOGLE_APPLICATION_CREDENTIALS",
+}
+# Whole variable families: Docker/BuildKit settings, docker credential
+# helpers (credsStore/credHelpers for ECR, GCR, ACR) and the GitHub Actions
+# cache (v1 and v2)
+_TOOL_ENV_PREFIXES = (
+    "DOCKER_",
+    "BUILDKIT_",
+    "AWS_",
+    "AZURE_",
+    "CLOUDSDK_",
+    "GOOGLE_",
+    "ACTIONS_",
+)
+
+
+def _tool_env() -> dict[str, str]:
+    """Build the environment for a buildctl/crane call from the current os.environ."""
+    return {
+        key: value
+        for key, value in os.environ.items()
+        if key in _TOOL_ENV_KEYS or key.startswith(_TOOL_ENV_PREFIXES)
+    }
+
+
+_docker_client: docker.DockerClient | None = None
+_docker_client_pid: int | None = None
+
+
+def _close_docker_client() -> None:
+    """Close the cached Docker client on interpreter exit."""
+    if _docker_client is not None and _docker_client_pid == os.getpid():
+        _docker_client.close()
+
+
+atexit.register(_close_docker_client)
+
 
 def get_docker_client() -> docker.DockerClient:
-    """Get Docker client for the host daemon."""
-    return docker.from_env()
+    """Get Docker client for the host daemon.
+
+    The client is created once per process and reused, so repeated status
+    checks share one connection pool to the Docker socket.
+    """
+    global _docker_client, _docker_client_pid
+
+    pid = os.getpid()
+    if _docker_client is None or _docker_client_pid != pid:
+        _docker_client = docker.from_env()
+        _docker_client_pid = pid
+    return _docker_client
 
 
 def get_socket_addr() -> str:
@@ -74,19 +206,21 @@ def get_socket_addr() -> str:
     return f"tcp://127.0.0.1:{CONTAINER_PORT}"
 
 
+@lru_cache(maxsize=None)
 def get_bin_path() -> Path:
-    """Get the path to the bin directory for the current platform."""
-    system = platform.system().lower()
-    machine = platform.machine().lower()
+    """Get the path to the bin directory for the current platform.
 
-    if system == "darwin" and machine == "arm64":
+    The result (and those of the binary lookups below) is cached, so the
+    existence checks only run once per process.
+    """
+    if _SYSTEM == "darwin" and _MACHINE == "arm64":
         platform_dir = "darwin-arm64"
-    elif system == "linux" and machine in ("x86_64", "amd64"):
+    elif _SYSTEM == "linux" and _MACHINE in ("x86_64", "amd64"):
         platform_dir = "linux-amd64"
-    elif system == "linux" and machine in ("arm64", "aarch64"):
+    elif _SYSTEM == "linux" and _MACHINE in ("arm64", "aarch64"):
         platform_dir = "linux-arm64"
     else:
-        raise RuntimeError(f"Unsupported platform: {system}-{machine}")
+        raise RuntimeError(f"Unsupported platform: {_SYSTEM}-{_MACHINE}")
 
     # Find bin directory relative to this file (manager/building.py -> bin/)
     bin_path = Path(__file__).parent.parent / "bin" / platform_dir
@@ -96,6 +230,7 @@ def get_bin_path() -> Path:
     return bin_path
 
 
+@lru_cache(maxsize=None)
 def get_buildctl_path() -> Path:
     """Get the path to the buildctl binary."""
     binary = get_bin_path() / "buildkit" / "buildctl"
@@ -126,14 +261,69 @@ def is_buildkitd_running() -> bool:
 def is_port_open(port: int, timeout: float = 0.1) -> bool:
     """Check if a TCP port is open."""
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(timeout)
-            s.connect(("127.0.0.1", port))
-            return True
-    except (ConnectionRefusedError, TimeoutError, OSError):
+        socket.create_connection(("127.0.0.1", port), timeout=timeout).close()
+        return True
+    except OSError:
         return False
 
 
+def _atomic_write(path: Path, data: str) -> None:
+    """Write a file atomically via a temp file in the same directory.
+
+    Readers never observe a partially written file. mkstemp creates the
+    temp file as 0600, so it is widened to the usual umask-based mode
+    before the rename; files like buildkitd.toml are bind-mounted into
+    containers running as a different user and must stay readable.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def wait_for_port(port: int, timeout: float) -> bool:
+    """Wait until a TCP port on localhost accepts connections.
+
+    Uses a non-blocking connect watched by a selector, so readiness is
+    detected as soon as the connection completes instead of on the next
+    fixed polling interval. Refused connections are retried with a short
+    exponential backoff (5ms doubling up to 50ms) until the timeout expires.
+
+    Returns True if the port became reachable, False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    backoff = 0.005
+
+    with selectors.DefaultSelector() as sel:
+        while (remaining := deadline - time.monotonic()) > 0:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.setblocking(False)
+                err = sock.connect_ex(("127.0.0.1", port))
+                if err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                    sel.register(sock, selectors.EVENT_WRITE)
+                    try:
+                        if not sel.select(remaining):
+                            return False
+                    finally:
+                        sel.unregister(sock)
+                    err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    return True
+            finally:
+                sock.close()
+
+            time.sleep(min(backoff, max(deadline - time.monotonic(), 0)))
+            backoff = min(backoff * 2, 0.05)
+
+    return False
+
+
 def start_buildkitd_container() -> int:
     """Start buildkitd as a Docker container.
 
@@ -165,8 +355,9 @@ def start_buildkitd_container() -> int:
     # Create config directory for buildkitd
     config_dir = DEFAULT_BUILDKIT_DIR / "config"
     config_dir.mkdir(parents=True, exist_ok=True)
+    # Already absolute (derived from __file__), usable as a bind mount source
     config_file = config_dir / "buildkitd.toml"
-    config_file.write_text(buildkitd_config)
+    _atomic_write(config_file, buildkitd_config)
 
     # Check if user wants rootless mode
     use_rootless = os.environ.get("BUILDKIT_ROOTLESS", "").lower() in ("1", "true", "yes")
@@ -186,7 +377,7 @@ def start_buildkitd_container() -> int:
                     "--oci-worker-no-process-sandbox",
                 ],
                 volumes={
-                    str(config_file.absolute()): {"bind": "/etc/buildkit/buildkitd.toml", "mode": "ro"},
+                    os.fspath(config_file): {"bind": "/etc/buildkit/buildkitd.toml", "mode": "ro"},
                 },
             )
         except APIError as e:
@@ -208,7 +399,7 @@ def start_buildkitd_container() -> int:
                     "--addr", f"tcp://0.0.0.0:{CONTAINER_PORT}",
                 ],
                 volumes={
-                    str(config_file.absolute()): {"bind": "/etc/buildkit/buildkitd.toml", "mode": "ro"},
+                    os.fspath(config_file): {"bind": "/etc/buildkit/buildkitd.toml", "mode": "ro"},
                 },
             )
         except APIError as e:
@@ -220,8 +411,14 @@ def start_buildkitd_container() -> int:
     addr = f"tcp://127.0.0.1:{CONTAINER_PORT}"
     buildctl = get_buildctl_path()
 
-    for i in range(30):  # 30 second timeout
-        if is_port_open(CONTAINER_PORT):
+    start = time.monotonic()
+    deadline = start + 30  # 30 second timeout
+    next_progress = start + 5
+    backoff = 0.05
+    while (remaining := deadline - time.monotonic()) > 0:
+        # Wait in slices of at most 5s, so progress is reported while the
+        # port still refuses connections
+        if wait_for_port(CONTAINER_PORT, min(remaining, 5.0)):
             # Port is open, verify buildkitd is actually responding
             try:
                 result = subprocess.run(
@@ -229,15 +426,20 @@ def start_buildkitd_container() -> int:
                     capture_output=True,
                     text=True,
                     timeout=5,
+                    env=_tool_env(),
                 )
                 if result.returncode == 0:
                     print(f"buildkitd container started (addr: {addr})")
                     return 0
             except subprocess.TimeoutExpired:
                 pass
-        time.sleep(1)
-        if i > 0 and i % 5 == 0:
-            print(f"Still waiting for buildkitd... ({i}/30)")
+            # Port accepts connections but buildkitd is not serving yet
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 1.0)
+        now = time.monotonic()
+        if now >= next_progress:
+            print(f"Still waiting for buildkitd... ({int(now - start)}/30)")
+            next_progress += 5
 
     # Check container logs for errors
     try:
@@ -388,7 +590,7 @@ def crane_login(registry: str, username: str, password: str) -> bool:
         "--password", password,
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = subprocess.run(cmd, capture_output=True, text=True, env=_tool_env())
 
     if result.returncode != 0:
         print(f"Warning: Crane login failed for {registry}: {result.stderr}", file=sys.stderr)
@@ -438,7 +640,7 @@ def get_cache_endpoint_for_buildkit() -> str | None:
     endpoint = cache.endpoint
 
     # For local development (localhost), adjust for macOS container
-    if platform.system().lower() == "darwin":
+    if _SYSTEM == "darwin":
         if "localhost" in endpoint or "127.0.0.1" in endpoint:
             # Replace localhost with host.docker.internal for container access
             endpoint = endpoint.replace("localhost", "host.docker.internal")
@@ -469,15 +671,78 @@ def check_cache_connection() -> bool:
             host = endpoint.split("/")[0]
             port = 443 if cache.endpoint.startswith("https") else 80
 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)
-        result = sock.connect_ex((host, port))
-        sock.close()
-        return result == 0
+        socket.create_connection((host, port), timeout=1).close()
+        return True
     except Exception:
         return False
 
 
+# --- Layer compression ---
+
+def get_compression_opts() -> str:
+    """Get buildctl exporter options for layer compression.
+
+    Layers are compressed by buildkitd while exporting, and with gzip at the
+    default level this dominates export time for large images. The
+    IMAGE_MANAGER_COMPRESSION (gzip, estargz, zstd) and
+    IMAGE_MANAGER_COMPRESSION_LEVEL variables tune it.
+
+    Returns:
+        Comma-prefixed exporter options, or an empty string for the defaults
+    """
+    opts = ""
+    compression = os.environ.get("IMAGE_MANAGER_COMPRESSION")
+    if compression:
+        opts += f",compression={compression}"
+        if compression == "zstd":
+            # zstd layers are only defined for OCI media types
+            opts += ",oci-mediatypes=true"
+    level = os.environ.get("IMAGE_MANAGER_COMPRESSION_LEVEL")
+    if level:
+        opts += f",compression-level={level}"
+    return opts
+
+
+# --- Registry cache ---
+
+def get_cache_branch() -> str | None:
+    """Get the CI branch name as a tag-safe string, if known."""
+    branch = os.environ.get("CI_COMMIT_REF_SLUG") or os.environ.get("GITHUB_REF_NAME")
+    if not branch:
+        return None
+    return _TAG_UNSAFE_RE.sub("-", branch)[:96]
+
+
+def get_registry_cache_args(image_name: str, platform_path: str) -> list[str]:
+    """Build buildctl cache arguments for the registry cache backend.
+
+    Cache is exported to the current branch ref (or 'latest' outside CI) and
+    imported from the branch, main and latest refs, so new branches start
+    warm from main. Insecure (HTTP) registries get registry.insecure=true,
+    like the image push output.
+
+    Args:
+        image_name: Image name (e.g., 'base')
+        platform_path: Platform as path segment (e.g., 'linux-amd64')
+
+    Returns:
+        List of --export-cache/--import-cache arguments
+    """
+    cache_repo = os.environ.get("DOCKER_CACHE_REPO") or f"{get_registry_addr_for_buildkit()}/{image_name}-buildcache"
+    branch = get_cache_branch()
+    insecure = ",registry.insecure=true" if is_registry_insecure() else ""
+
+    args = [
+        "--export-cache",
+        f"type=registry,ref={cache_repo}:{platform_path}-{branch or 'latest'},mode=max,oci-mediatypes=true{insecure}",
+    ]
+    for ref in dict.fromkeys([branch, "main", "latest"]):
+        if ref:
+            args.extend(["--import-cache", f"type=registry,ref={cache_repo}:{platform_path}-{ref}{insecure}"])
+    return args
+
+
+@lru_cache(maxsize=None)
 def get_crane_path() -> Path:
     """Get the path to the crane binary."""
     binary = get_bin_path() / "crane"
@@ -488,20 +753,20 @@ def get_crane_path() -> Path:
 
 def get_native_platform() -> str:
     """Detect the native platform for the current system."""
-    machine = platform.machine().lower()
-    if machine in ("x86_64", "amd64"):
+    if _MACHINE in ("x86_64", "amd64"):
         return "linux/amd64"
-    elif machine in ("arm64", "aarch64"):
+    elif _MACHINE in ("arm64", "aarch64"):
         return "linux/arm64"
     else:
-        raise RuntimeError(f"Unsupported architecture: {machine}")
+        raise RuntimeError(f"Unsupported architecture: {_MACHINE}")
 
 
 def normalize_platform(plat: str) -> str:
     """Normalize platform string to full form (e.g., 'amd64' -> 'linux/amd64')."""
-    if plat not in PLATFORM_ALIASES:
-        raise ValueError(f"Unknown platform: {plat}. Supported: {list(PLATFORM_ALIASES.keys())}")
-    return PLATFORM_ALIASES[plat]
+    normalized = PLATFORM_ALIASES.get(plat)
+    if normalized is None:
+        raise ValueError(f"Unknown platform: {plat}. Supported: {list(_PLATFORM_ALIAS_KEYS)}")
+    return normalized
 
 
 def platform_to_path(plat: str) -> str:
@@ -516,18 +781,14 @@ def needs_emulation(target_platform: str) -> bool:
 
 
 def is_binfmt_installed() -> bool:
-    """Check if binfmt handlers are registered for cross-platform builds."""
-    # Check if QEMU handlers are registered
-    binfmt_misc = Path("/proc/sys/fs/binfmt_misc")
-    if not binfmt_misc.exists():
-        return False
-
-    # Look for qemu handlers
-    for entry in binfmt_misc.iterdir():
-        if entry.name.startswith("qemu-"):
-            return True
+    """Check if binfmt handlers are registered for cross-platform builds.
 
-    return False
+    Only the handler for the foreign architecture of the supported platform
+    pair is checked (qemu-aarch64 on amd64 hosts, qemu-x86_64 on arm64 hosts).
+    """
+    native = get_native_platform()
+    handler = "qemu-aarch64" if native == "linux/amd64" else "qemu-x86_64"
+    return os.path.exists(f"/proc/sys/fs/binfmt_misc/{handler}")
 
 
 def ensure_binfmt() -> bool:
@@ -557,38 +818,6 @@ def ensure_binfmt() -> bool:
         return False
 
 
-def push_to_registry(tar_path: Path, image_ref: str) -> bool:
-    """Push a tar image to the local registry using crane.
-
-    Args:
-        tar_path: Path to the image tar file
-        image_ref: Image reference (e.g., 'base:2025.09')
-
-    Returns:
-        True if successful, False otherwise
-    """
-    crane = get_crane_path()
-    registry_ref = f"{get_registry_addr()}/{image_ref}"
-
-    cmd = [
-        str(crane),
-        "push",
-        str(tar_path),
-        registry_ref,
-    ]
-    if is_registry_insecure():
-        cmd.append("--insecure")
-
-    print(f"Pushing to registry: {registry_ref}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    if result.returncode != 0:
-        print(f"Failed to push to registry: {result.stderr}", file=sys.stderr)
-        return False
-
-    return True
-
-
 def get_aliases_for_tag(image_name: str, tag_name: str) -> list[str]:
     """Get all aliases that point to a specific tag.
 
@@ -653,7 +882,7 @@ def tag_aliases(image_ref: str, snapshot_id: str | None = None) -> int:
     check_cmd = [str(crane), "digest", source_ref]
     if is_registry_insecure():
         check_cmd.insert(2, "--insecure")
-    result = subprocess.run(check_cmd, capture_output=True, text=True)
+    result = subprocess.run(check_cmd, capture_output=True, text=True, env=_tool_env())
     if result.returncode != 0:
         print(f"Error: Image not found in registry: {source_ref}", file=sys.stderr)
         return 1
@@ -679,7 +908,7 @@ def tag_aliases(image_ref: str, snapshot_id: str | None = None) -> int:
         tag_cmd = [str(crane), "tag", source_ref, alias_tag]
         if is_registry_insecure():
             tag_cmd.insert(2, "--insecure")
-        tag_result = subprocess.run(tag_cmd, capture_output=True, text=True)
+        tag_result = subprocess.run(tag_cmd, capture_output=True, text=True, env=_tool_env())
 
         if tag_result.returncode != 0:
             print(f"  Failed to tag {alias}: {tag_result.stderr}", file=sys.stderr)
@@ -708,7 +937,6 @@ def check_image_exists(image_ref: str, snapshot_id: str | None = None) -> bool:
         return False
 
     name, tag = image_ref.split(":", 1)
-    crane = get_crane_path()
     registry = get_registry_addr()
 
     if snapshot_id:
@@ -716,11 +944,25 @@ def check_image_exists(image_ref: str, snapshot_id: str | None = None) -> bool:
     else:
         full_ref = f"{registry}/{name}:{tag}"
 
-    check_cmd = [str(crane), "digest", full_ref]
+    return get_registry_digest(full_ref) is not None
+
+
+def get_registry_digest(full_ref: str) -> str | None:
+    """Get the manifest digest of an image in the registry.
+
+    Args:
+        full_ref: Full image reference including registry
+
+    Returns:
+        Digest (e.g., 'sha256:abc...') or None if the image doesn't exist
+    """
+    cmd = [str(get_crane_path()), "digest", full_ref]
     if is_registry_insecure():
-        check_cmd.insert(2, "--insecure")
-    result = subprocess.run(check_cmd, capture_output=True, text=True)
-    return result.returncode == 0
+        cmd.insert(2, "--insecure")
+    result = subprocess.run(cmd, capture_output=True, text=True, env=_tool_env())
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
 
 
 def get_local_images() -> set[str]:
@@ -731,40 +973,54 @@ def get_local_images() -> set[str]:
     the configured registry even if they haven't been built locally yet.
     """
     images = set()
-    dist_path = Path("dist")
-    if not dist_path.exists():
+
+    # os.scandir reuses the d_type from the directory read for is_dir(),
+    # avoiding a stat per entry
+    try:
+        image_entries = os.scandir("dist")
+    except FileNotFoundError:
         return images
 
-    for image_dir in dist_path.iterdir():
-        if not image_dir.is_dir():
-            continue
-        for tag_dir in image_dir.iterdir():
-            if not tag_dir.is_dir():
+    with image_entries:
+        for image_entry in image_entries:
+            if not image_entry.is_dir():
                 continue
-            # Check for Dockerfile (generated by image-manager generate)
-            if (tag_dir / "Dockerfile").exists():
-                images.add(f"{image_dir.name}:{tag_dir.name}")
+            with os.scandir(image_entry.path) as tag_entries:
+                for tag_entry in tag_entries:
+                    if not tag_entry.is_dir():
+                        continue
+                    # Check for Dockerfile (generated by image-manager generate)
+                    if os.path.exists(os.path.join(tag_entry.path, "Dockerfile")):
+                        images.add(f"{image_entry.name}:{tag_entry.name}")
 
     return images
 
 
-def rewrite_dockerfile_for_registry(dockerfile_path: Path, local_images: set[str], snapshot_id: str | None = None) -> str:
+def rewrite_dockerfile_for_registry(
+    content: str,
+    local_images: set[str],
+    snapshot_id: str | None = None,
+    cache_mounts: bool = False,
+) -> tuple[str, int]:
     """Rewrite Dockerfile FROM lines to use local registry for local base images.
 
     Args:
-        dockerfile_path: Path to the original Dockerfile
+        content: Original Dockerfile content
         local_images: Set of image refs available in local registry (without snapshot suffix)
         snapshot_id: Optional snapshot ID - used to match snapshot-suffixed FROM refs
+        cache_mounts: If True, also add cache mounts to package manager RUN
+                      instructions (see inject_cache_mounts)
 
     Returns:
-        Modified Dockerfile content
+        Tuple of (Dockerfile content, number of rewritten lines).
+        When nothing was rewritten the original content is returned as-is.
     """
-    content = dockerfile_path.read_text()
-    registry = get_registry_addr_for_buildkit()
+    # No FROM at all - nothing to rewrite
+    if "FROM" not in content.upper():
+        return content, 0
 
-    # Match FROM lines, capturing the image reference
-    # Handles: FROM image:tag, FROM image:tag AS name, FROM image AS name
-    from_pattern = re.compile(r'^(FROM\s+)([^\s]+)(.*)$', re.MULTILINE | re.IGNORECASE)
+    registry = get_registry_addr_for_buildkit()
+    rewritten = 0
 
     def replace_from(match):
         prefix = match.group(1)
@@ -778,12 +1034,68 @@ def rewrite_dockerfile_for_registry(dockerfile_path: Path, local_images: set[str
             base_ref = image_ref[: -len(f"-{snapshot_id}")]
 
         if base_ref in local_images:
+            nonlocal rewritten
+            rewritten += 1
             # Use the full image_ref (which may include snapshot suffix from generate)
             return f"{prefix}{registry}/{image_ref}{suffix}"
 
         return match.group(0)
 
-    return from_pattern.sub(replace_from, content)
+    new_content = _FROM_RE.sub(replace_from, content)
+    if cache_mounts:
+        new_content, mounted = inject_cache_mounts(new_content)
+        rewritten += mounted
+    if not rewritten:
+        return content, 0
+    return new_content, rewritten
+
+
+def inject_cache_mounts(content: str) -> tuple[str, int]:
+    """Add BuildKit cache mounts to RUN instructions that use package managers.
+
+    apt list cleanup (rm -rf /var/lib/apt/lists/*, apt-get clean) is dropped
+    from instructions that get the apt mounts, as it would only empty the cache.
+    Downloaded packages are kept in the mounted /var/cache/apt for the duration
+    of the instruction only; the image's apt config is left unchanged.
+    RUN instructions that already use a cache mount are left alone.
+
+    Args:
+        content: Dockerfile content
+
+    Returns:
+        Tuple of (Dockerfile content, number of rewritten RUN instructions)
+    """
+    if "RUN" not in content.upper():
+        return content, 0
+
+    rewritten = 0
+
+    def replace_run(match):
+        prefix = match.group(1)
+        command = match.group(2)
+        if "--mount=type=cache" in command or command.startswith("<<"):
+            return match.group(0)
+
+        mounts = []
+        for pattern, tool_mounts in CACHE_MOUNTS:
+            if pattern.search(command):
+                mounts.extend(tool_mounts)
+        if not mounts:
+            return match.group(0)
+
+        if _APT_RE.search(command):
+            command = _APT_CLEANUP_RE.sub("", command)
+            command = _APT_INSTALL_CMD_RE.sub(_APT_KEEP_PACKAGES, command)
+            command = f"{_APT_HOOK_OFF}{command.rstrip()}{_APT_HOOK_ON}"
+
+        nonlocal rewritten
+        rewritten += 1
+        return f"{prefix}{' '.join(mounts)} {command}"
+
+    new_content = _RUN_RE.sub(replace_run, content)
+    if not rewritten:
+        return content, 0
+    return new_content, rewritten
 
 
 def find_build_context(image_ref: str) -> Path:
@@ -816,13 +1128,42 @@ def find_build_context(image_ref: str) -> Path:
     return context_path
 
 
+def ensure_dockerignore(context_path: Path) -> int:
+    """Write a default .dockerignore into a build context if it has none.
+
+    Build contexts live in dist/ next to previous build outputs (image tars,
+    SBOMs), which would otherwise be uploaded to buildkitd on every build.
+
+    Args:
+        context_path: Path to the build context
+
+    Returns:
+        Number of bytes excluded from the context, 0 if a .dockerignore exists
+    """
+    dockerignore = context_path / ".dockerignore"
+    if dockerignore.exists():
+        return 0
+
+    _atomic_write(dockerignore, "\n".join(DOCKERIGNORE_DEFAULTS) + "\n")
+
+    saved_bytes = 0
+    for entry in context_path.iterdir():
+        if not any(fnmatch.fnmatch(entry.name, pattern.rstrip("/")) for pattern in DOCKERIGNORE_DEFAULTS):
+            continue
+        if entry.is_dir():
+            saved_bytes += sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+        else:
+            saved_bytes += entry.stat().st_size
+    return saved_bytes
+
+
 def get_image_tar_path(image_ref: str) -> Path:
     """Get the path to the image tar file for an image reference."""
     if ":" not in image_ref:
         raise ValueError(f"Invalid image reference '{image_ref}', expected format: name:tag")
 
     name, tag = image_ref.split(":", 1)
-    return Path("dist") / name / tag / "image.tar"
+    return _image_tar_path(name, tag)
 
 
 def get_platform_tar_path(image_ref: str, plat: str) -> Path:
@@ -831,8 +1172,53 @@ def get_platform_tar_path(image_ref: str, plat: str) -> Path:
         raise ValueError(f"Invalid image reference '{image_ref}', expected format: name:tag")
 
     name, tag = image_ref.split(":", 1)
-    platform_dir = platform_to_path(plat)
-    return Path("dist") / name / tag / platform_dir / "image.tar"
+    return _platform_tar_path(name, tag, plat)
+
+
+def _image_tar_path(name: str, tag: str) -> Path:
+    """Image tar path for an already split image reference."""
+    return Path(f"dist/{name}/{tag}/image.tar")
+
+
+def _platform_tar_path(name: str, tag: str, plat: str) -> Path:
+    """Platform tar path for an already split image reference."""
+    return Path(f"dist/{name}/{tag}/{platform_to_path(plat)}/image.tar")
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Place src at dst without duplicating data where possible.
+
+    Tries a hardlink first (instant, no extra disk usage), then a
+    kernel-side copy via copy_file_range (reflink on btrfs/xfs), and
+    finally falls back to a regular copy.
+
+    An existing dst is removed first: it may itself be a hardlink, and
+    writing into it would modify the other file too.
+    """
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                shutil.copystat(src, dst)
+                return
+        except OSError:
+            pass
+        dst.unlink(missing_ok=True)
+
+    shutil.copy2(src, dst)
 
 
 def _get_git_revision() -> str | None:
@@ -875,25 +1261,25 @@ def _get_git_remote_url() -> str | None:
     return None
 
 
-def _get_base_image_info(context_path: Path) -> tuple[str, str | None] | None:
+def _get_base_image_info(context_path: Path, content: str | None = None) -> tuple[str, str | None] | None:
     """Extract base image name and digest from Dockerfile and lock file.
 
     Args:
         context_path: Path to build context containing Dockerfile
+        content: Optional Dockerfile content, if already read by the caller
 
     Returns:
         Tuple of (base_name, base_digest) or None if not found.
         base_digest may be None if not available in lock file.
     """
-    dockerfile = context_path / "Dockerfile"
-    if not dockerfile.exists():
-        return None
-
-    content = dockerfile.read_text()
+    if content is None:
+        dockerfile = context_path / "Dockerfile"
+        if not dockerfile.exists():
+            return None
+        content = dockerfile.read_text()
 
     # Find the last FROM line (for multi-stage builds)
-    from_pattern = re.compile(r"^FROM\s+([^\s]+)", re.MULTILINE | re.IGNORECASE)
-    matches = from_pattern.findall(content)
+    matches = [match.group(2) for match in _FROM_RE.finditer(content)]
     if not matches:
         return None
 
@@ -953,35 +1339,79 @@ def _get_image_config(image_name: str):
     return None
 
 
+def _run_build_command(cmd: list[str], log_prefix: str | None = None) -> int:
+    """Run a buildctl command, streaming its output.
+
+    Without a prefix the output goes straight to the terminal. With a prefix
+    each line is tagged, so concurrent builds don't garble each other.
+
+    Returns:
+        Exit code of the command
+    """
+    if log_prefix is None:
+        # Stream output in real-time (don't capture)
+        return subprocess.run(cmd, env=_tool_env()).returncode
+
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        env=_tool_env(),
+    ) as proc:
+        for line in proc.stdout:
+            print(f"[{log_prefix}] {line}", end="", file=sys.stderr, flush=True)
+    return proc.returncode
+
+
 def run_build_platform(
-    image_ref: str,
+    image_name: str,
+    image_tag: str,
     plat: str,
     context_path: Path | None = None,
     use_cache: bool = True,
     snapshot_id: str | None = None,
-) -> int:
+    log_prefix: str | None = None,
+    dockerfile_content: str | None = None,
+    rewrite: tuple[str, int] | None = None,
+) -> tuple[int, Path, str]:
     """Build an image for a specific platform.
 
+    The image is written to the platform tar and pushed to the registry by
+    buildkitd in the same export.
+
     Args:
-        image_ref: Image reference in format 'name:tag'
+        image_name: Image name (e.g., 'base')
+        image_tag: Image tag (e.g., '2025.09')
         plat: Target platform (e.g., 'linux/amd64')
         context_path: Optional explicit path to build context
         use_cache: If True, use S3 cache via Garage
         snapshot_id: Optional snapshot identifier for registry tags
+        log_prefix: Optional prefix for buildctl output lines, used to keep
+                    concurrent platform builds readable
+        dockerfile_content: Optional Dockerfile content, if already read by the caller
+        rewrite: Optional precomputed result of rewrite_dockerfile_for_registry,
+                 shared across platforms since the Dockerfile is the same
 
     Returns:
-        Exit code (0 for success)
+        Tuple of (exit code, platform tar path, platform registry reference)
     """
+    image_ref = f"{image_name}:{image_tag}"
     if context_path is None:
         context_path = find_build_context(image_ref)
 
-    tar_path = get_platform_tar_path(image_ref, plat)
+    platform_path = platform_to_path(plat)
+    tar_path = _platform_tar_path(image_name, image_tag, plat)
     tar_path.parent.mkdir(parents=True, exist_ok=True)
+    # A previous single-platform build may have hardlinked image.tar to this
+    # file; buildctl writes dest= in place, so start from a fresh inode
+    tar_path.unlink(missing_ok=True)
 
     buildctl = get_buildctl_path()
     addr = get_socket_addr()
     registry = get_registry_addr()
-    platform_path = platform_to_path(plat)
+    cache_name = f"{image_name}-{platform_path}"
 
     # Build cache arguments
     cache_args = []
@@ -990,7 +1420,6 @@ def run_build_platform(
         s3_endpoint = get_cache_endpoint_for_buildkit()
         if cache and s3_endpoint and check_cache_connection():
             # S3 cache (preferred)
-            cache_name = f"{image_ref.split(':')[0]}-{platform_path}"
             path_style = "true" if cache.use_path_style else "false"
             cache_args = [
                 "--export-cache", f"type=s3,endpoint_url={s3_endpoint},bucket={cache.bucket},region={cache.region},name={cache_name},access_key_id={cache.access_key},secret_access_key={cache.secret_key},use_path_style={path_style},mode=max",
@@ -999,24 +1428,46 @@ def run_build_platform(
         elif is_github_actions():
             # GitHub Actions cache (automatic fallback)
             # ignore-error=true allows builds to continue if cache restore fails (e.g., first run)
-            cache_name = f"{image_ref.split(':')[0]}-{platform_path}"
             cache_args = [
                 "--export-cache", f"type=gha,mode=max,scope={cache_name}",
                 "--import-cache", f"type=gha,scope={cache_name},ignore-error=true",
             ]
             print(f"Using GitHub Actions cache (scope: {cache_name})")
+        else:
+            # Registry cache (no extra infrastructure needed)
+            cache_args = get_registry_cache_args(image_name, platform_path)
+            print(f"Using registry cache (branch: {get_cache_branch() or 'latest'})")
+
+    if dockerfile_content is None:
+        dockerfile_content = (context_path / "Dockerfile").read_text()
 
     # Rewrite FROM for local base images
-    dockerfile_path = context_path / "Dockerfile"
-    local_images = get_local_images()
-    modified_content = rewrite_dockerfile_for_registry(dockerfile_path, local_images, snapshot_id)
-    original_content = dockerfile_path.read_text()
+    if rewrite is None:
+        image_config = _get_image_config(image_name)
+        rewrite = rewrite_dockerfile_for_registry(
+            dockerfile_content,
+            get_local_images(),
+            snapshot_id,
+            cache_mounts=image_config is not None and image_config.cache_mounts,
+        )
+    modified_content, rewritten = rewrite
 
     # Platform-specific image name for registry
     platform_image_ref = f"{image_ref}-{platform_path}"
+    registry_ref = platform_image_ref
+    if snapshot_id:
+        registry_ref = f"{image_ref}-{snapshot_id}-{platform_path}"
 
-    # Extract name and tag for labels
-    image_name, image_tag = image_ref.split(":", 1)
+    # Write the tar and push to the registry from the same export, so the
+    # image isn't read back from disk for a separate push
+    compression_opts = get_compression_opts()
+    push_output = f"type=image,name={get_registry_addr_for_buildkit()}/{registry_ref},push=true,rewrite-timestamp=true{compression_opts}"
+    if is_registry_insecure():
+        push_output += ",registry.insecure=true"
+    output_args = [
+        "--output", f"type=docker,name={platform_image_ref},dest={tar_path},rewrite-timestamp=true{compression_opts}",
+        "--output", push_output,
+    ]
 
     # Build reproducibility args
     repro_args = [
@@ -1073,66 +1524,42 @@ def run_build_platform(
         label_args.extend(["--opt", f"label:org.opencontainers.image.licenses={labels_config.licenses}"])
 
     # Add base image labels from Dockerfile
-    base_info = _get_base_image_info(context_path)
+    base_info = _get_base_image_info(context_path, dockerfile_content)
     if base_info:
         base_name, base_digest = base_info
         label_args.extend(["--opt", f"label:org.opencontainers.image.base.name={base_name}"])
         if base_digest:
             label_args.extend(["--opt", f"label:org.opencontainers.image.base.digest={base_digest}"])
 
-    if modified_content != original_content:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_dockerfile = Path(tmpdir) / "Dockerfile"
-            tmp_dockerfile.write_text(modified_content)
-
-            cmd = [
-                str(buildctl), "--addr", addr, "build",
-                "--frontend", "dockerfile.v0",
-                "--local", f"context={context_path}",
-                "--local", f"dockerfile={tmpdir}",
-                "--output", f"type=docker,name={platform_image_ref},dest={tar_path},rewrite-timestamp=true",
-                "--opt", f"platform={plat}",
-            ] + repro_args + label_args + cache_args
-
-            print(f"Building {image_ref} for {plat}...")
-            print(f"Command: {' '.join(cmd)}", file=sys.stderr)
-            sys.stderr.flush()
-            sys.stdout.flush()
-            # Stream output in real-time (don't capture)
-            result = subprocess.run(cmd)
-            if result.returncode != 0:
-                print(f"Build failed for {image_ref} ({plat}) with exit code {result.returncode}", file=sys.stderr)
-    else:
+    # The rewritten Dockerfile goes into a temp dir outside the build
+    # context, so it is never sent as part of the context itself
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dockerfile_dir = context_path
+        if rewritten:
+            (Path(tmpdir) / "Dockerfile").write_text(modified_content)
+            dockerfile_dir = tmpdir
+
         cmd = [
             str(buildctl), "--addr", addr, "build",
             "--frontend", "dockerfile.v0",
             "--local", f"context={context_path}",
-            "--local", f"dockerfile={context_path}",
-            "--output", f"type=docker,name={platform_image_ref},dest={tar_path},rewrite-timestamp=true",
+            "--local", f"dockerfile={dockerfile_dir}",
             "--opt", f"platform={plat}",
-        ] + repro_args + label_args + cache_args
+        ] + output_args + repro_args + label_args + cache_args
 
         print(f"Building {image_ref} for {plat}...")
         print(f"Command: {' '.join(cmd)}", file=sys.stderr)
         sys.stderr.flush()
         sys.stdout.flush()
-        # Stream output in real-time (don't capture)
-        result = subprocess.run(cmd)
-        if result.returncode != 0:
-            print(f"Build failed for {image_ref} ({plat}) with exit code {result.returncode}", file=sys.stderr)
+        returncode = _run_build_command(cmd, log_prefix)
+    if returncode != 0:
+        print(f"Build failed for {image_ref} ({plat}) with exit code {returncode}", file=sys.stderr)
 
-    if result.returncode == 0:
+    if returncode == 0:
         print(f"Platform image saved to: {tar_path}")
+        print(f"Platform image pushed: {registry}/{registry_ref}")
 
-        # Push platform-specific image to registry
-        registry_ref = platform_image_ref
-        if snapshot_id:
-            registry_ref = f"{image_ref}-{snapshot_id}-{platform_path}"
-
-        if push_to_registry(tar_path, registry_ref):
-            print(f"Platform image pushed: {get_registry_addr()}/{registry_ref}")
-
-    return result.returncode
+    return returncode, tar_path, registry_ref
 
 
 def create_multiplatform_manifest(
@@ -1160,22 +1587,13 @@ def create_multiplatform_manifest(
         raise ValueError(f"Invalid image reference '{image_ref}'")
 
     name, tag = image_ref.split(":", 1)
-    manifest_tar = Path("dist") / name / tag / "image.tar"
-
-    # Build list of platform image references in registry
-    platform_refs = []
-    for plat in platforms:
-        platform_path = platform_to_path(plat)
-        if snapshot_id:
-            ref = f"{registry}/{image_ref}-{snapshot_id}-{platform_path}"
-        else:
-            ref = f"{registry}/{image_ref}-{platform_path}"
-        platform_refs.append(ref)
+    manifest_tar = get_image_tar_path(image_ref)
 
-    # Create manifest using crane index append
+    # Multi-platform manifest and platform image references in registry
     manifest_ref = f"{registry}/{image_ref}"
     if snapshot_id:
         manifest_ref = f"{registry}/{image_ref}-{snapshot_id}"
+    platform_refs = [f"{manifest_ref}-{platform_to_path(plat)}" for plat in platforms]
 
     print(f"Creating multi-platform manifest: {manifest_ref}")
 
@@ -1189,27 +1607,54 @@ def create_multiplatform_manifest(
     for ref in platform_refs:
         cmd.extend(["-m", ref])
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Only stderr is reported, and only decoded on failure
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=_tool_env())
 
     if result.returncode != 0:
-        print(f"Failed to create manifest: {result.stderr}", file=sys.stderr)
+        print(f"Failed to create manifest: {result.stderr.decode(errors='replace')}", file=sys.stderr)
         return result.returncode
 
     print(f"Multi-platform manifest pushed: {manifest_ref}")
 
-    # Export manifest to tar
+    # The tar only needs exporting when the index changed since the last
+    # export; pulling it downloads every platform image
+    digest_file = manifest_tar.with_name("image.tar.digest")
+    digest = get_registry_digest(manifest_ref)
+    if (
+        digest
+        and manifest_tar.exists()
+        and digest_file.exists()
+        and digest_file.read_text().strip() == digest
+    ):
+        print(f"Multi-platform image unchanged, keeping: {manifest_tar}")
+        return 0
+
+    # Export manifest to tar. The layers were just pushed from this machine,
+    # and rebuilt layers are reproducible, so keep a local layer cache to
+    # avoid downloading the same blobs on every build
     export_cmd = [
         str(crane), "pull",
+        "--cache_path", str(CRANE_CACHE_DIR),
         manifest_ref, str(manifest_tar),
     ]
     if is_registry_insecure():
         export_cmd.insert(2, "--insecure")
+    CRANE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    # image.tar may be a hardlink to a platform tar from an earlier
+    # single-platform build; crane writes in place, so unlink it first.
+    # The digest goes too, and is only written back once the pull succeeded,
+    # so a failed pull never leaves a stale digest next to a partial tar
+    digest_file.unlink(missing_ok=True)
+    manifest_tar.unlink(missing_ok=True)
 
-    export_result = subprocess.run(export_cmd, capture_output=True, text=True)
+    export_result = subprocess.run(export_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=_tool_env())
     if export_result.returncode == 0:
+        if digest:
+            _atomic_write(digest_file, f"{digest}\n")
         print(f"Multi-platform image saved to: {manifest_tar}")
     else:
-        print(f"Warning: Could not export manifest to tar: {export_result.stderr}", file=sys.stderr)
+        print(f"Warning: Could not export manifest to tar: {export_result.stderr.decode(errors='replace')}", file=sys.stderr)
 
     return 0
 
@@ -1236,7 +1681,6 @@ def create_manifest_from_registry(
         print("Run 'docker compose up -d' to start infrastructure services.", file=sys.stderr)
         return 1
 
-    crane = get_crane_path()
     registry = get_registry_addr()
 
     if ":" not in image_ref:
@@ -1254,12 +1698,7 @@ def create_manifest_from_registry(
             ref = f"{registry}/{image_ref}-{platform_path}"
 
         # Check if image exists using crane digest
-        check_cmd = [str(crane), "digest", ref]
-        if is_registry_insecure():
-            check_cmd.insert(2, "--insecure")
-        result = subprocess.run(check_cmd, capture_output=True, text=True)
-
-        if result.returncode == 0:
+        if get_registry_digest(ref):
             print(f"Found platform image: {ref}")
             available_platforms.append(plat)
         else:
@@ -1299,6 +1738,11 @@ def run_build(
     Returns:
         Exit code from buildctl
     """
+    if ":" not in image_ref:
+        raise ValueError(f"Invalid image reference '{image_ref}', expected format: name:tag")
+
+    name, tag = image_ref.split(":", 1)
+
     # Check registry connection (to the push registry)
     push_registry = get_push_registry()
     if not check_registry_connection():
@@ -1315,6 +1759,10 @@ def run_build(
     else:
         platforms = [normalize_platform(p) for p in platforms]
 
+    if not platforms:
+        print(f"Error: No platforms to build {image_ref} for", file=sys.stderr)
+        return 1
+
     # Check if we need emulation
     native = get_native_platform()
     needs_cross = any(p != native for p in platforms)
@@ -1330,20 +1778,50 @@ def run_build(
 
     print(f"Building {image_ref} for platforms: {', '.join(platforms)}")
 
-    # Build each platform
-    successful_platforms = []
-    for plat in platforms:
-        result = run_build_platform(
-            image_ref=image_ref,
-            plat=plat,
-            context_path=context_path,
-            use_cache=use_cache,
-            snapshot_id=snapshot_id,
-        )
-        if result == 0:
-            successful_platforms.append(plat)
-        else:
-            print(f"Failed to build for {plat}", file=sys.stderr)
+    image_config = _get_image_config(name)
+    if image_config is None or image_config.auto_dockerignore:
+        saved_bytes = ensure_dockerignore(context_path)
+        if saved_bytes:
+            print(f"Auto-generated .dockerignore saved {saved_bytes} bytes")
+
+    # The Dockerfile is the same for every platform, so read and rewrite it once
+    dockerfile_content = (context_path / "Dockerfile").read_text()
+    rewrite = rewrite_dockerfile_for_registry(
+        dockerfile_content,
+        get_local_images(),
+        snapshot_id,
+        cache_mounts=image_config is not None and image_config.cache_mounts,
+    )
+
+    # Build all platforms concurrently (the work happens in buildkitd)
+    concurrent = len(platforms) > 1
+    with ThreadPoolExecutor(max_workers=len(platforms)) as build_executor:
+        builds = {
+            build_executor.submit(
+                run_build_platform,
+                image_name=name,
+                image_tag=tag,
+                plat=plat,
+                context_path=context_path,
+                use_cache=use_cache,
+                snapshot_id=snapshot_id,
+                log_prefix=plat if concurrent else None,
+                dockerfile_content=dockerfile_content,
+                rewrite=rewrite,
+            ): plat
+            for plat in platforms
+        }
+        built = set()
+        for build in as_completed(builds):
+            plat = builds[build]
+            result, _, _ = build.result()
+            if result == 0:
+                built.add(plat)
+            else:
+                print(f"Failed to build for {plat}", file=sys.stderr)
+
+    # Keep the requested platform order for the manifest
+    successful_platforms = [plat for plat in platforms if plat in built]
 
     if not successful_platforms:
         print("Error: All platform builds failed", file=sys.stderr)
@@ -1361,14 +1839,16 @@ def run_build(
     elif len(successful_platforms) == 1:
         # Single platform: copy to main image.tar location for compatibility
         plat = successful_platforms[0]
-        platform_tar = get_platform_tar_path(image_ref, plat)
-        main_tar = get_image_tar_path(image_ref)
+        main_tar = _image_tar_path(name, tag)
+        platform_tar = _platform_tar_path(name, tag, plat)
 
         if platform_tar.exists():
             main_tar.parent.mkdir(parents=True, exist_ok=True)
             if main_tar.exists() or main_tar.is_symlink():
                 main_tar.unlink()
-            shutil.copy2(platform_tar, main_tar)
+            # No longer the exported multi-platform image
+            main_tar.with_name("image.tar.digest").unlink(missing_ok=True)
+            link_or_copy(platform_tar, main_tar)
             print(f"Image saved to: {main_tar}")
 
     failed_count = len(platforms) - len(successful_platforms)
@@ -1377,7 +1857,6 @@ def run_build(
         return 1 if not successful_platforms else 0
 
     # Generate tag report
-    name, tag = image_ref.split(":", 1)
     report_path = generate_tag_report(name, tag, snapshot_id)
     print(f"Tag report: {report_path}")
 
@@ -1,49 +1,74 @@
 """CI configuration generator for GitLab and other providers."""
 
+import os
+from collections import deque
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
 from jinja2 import Environment, FileSystemLoader
 
+from manager.config import get_registry_url, get_registries, get_cache_config, get_labels_config
 from manager.dependency_graph import extract_dependencies
 
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
 MAIN_TEMPLATE_NAME = "pipeline.yml.j2"
 
 
+@lru_cache(maxsize=None)
+def _get_env(template_dir: Path) -> Environment:
+    """Get a Jinja2 environment for a template directory.
+
+    Environments are cached, so templates are only loaded and compiled once
+    per process.
+    """
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        keep_trailing_newline=True,
+        auto_reload=False,
+        cache_size=-1,
+    )
+
+
 def _calculate_depths(image_names: set[str], dependencies: dict[str, set[str]]) -> dict[str, int]:
     """Calculate dependency depth for each image.
 
     Depth 0 = no dependencies, depth 1 = depends only on depth-0 images, etc.
+    Uses Kahn's algorithm, so each dependency edge is visited once.
     """
-    depths = {}
-    remaining = set(image_names)
-
-    current_depth = 0
-    while remaining:
-        # Find images whose dependencies are all already assigned depths
-        ready = set()
-        for name in remaining:
-            deps = dependencies.get(name, set()) & image_names
-            if all(d in depths for d in deps):
-                ready.add(name)
-
-        if not ready:
-            # Circular dependency or bug - assign remaining to current depth
-            for name in remaining:
-                depths[name] = current_depth
-            break
-
-        for name in ready:
-            depths[name] = current_depth
-            remaining.remove(name)
-
-        current_depth += 1
+    deps = {name: dependencies.get(name, set()) & image_names for name in image_names}
+    dependents = {name: [] for name in image_names}
+    for name, name_deps in deps.items():
+        for dep in name_deps:
+            dependents[dep].append(name)
+
+    pending = {name: len(name_deps) for name, name_deps in deps.items()}
+    depths = {name: 0 for name, count in pending.items() if not count}
+    queue = deque(depths)
+
+    while queue:
+        name = queue.popleft()
+        for dependent in dependents[name]:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                depths[dependent] = max(depths[d] for d in deps[dependent]) + 1
+                queue.append(dependent)
+
+    if len(depths) < len(image_names):
+        # Circular dependency or bug - assign remaining to the next depth
+        next_depth = max(depths.values()) + 1 if depths else 0
+        for name in image_names:
+            depths.setdefault(name, next_depth)
 
     return depths
 
 
-def build_ci_context(images: list, artifacts: bool = False, ci_image: str | None = None) -> dict:
+def build_ci_context(
+    images: list,
+    artifacts: bool = False,
+    ci_image: str | None = None,
+    dependencies: dict[str, set[str]] | None = None,
+) -> dict:
     """Build context dictionary for CI templates.
 
     Args:
@@ -52,47 +77,40 @@ def build_ci_context(images: list, artifacts: bool = False, ci_image: str | None
                    When False, jobs use the registry directly for image transfer.
                    When True, jobs upload/download artifacts (can be GB+ in size).
         ci_image: Docker image for CI jobs (optional, templates use default if None)
+        dependencies: Optional result of extract_dependencies(images), if the
+                      caller already has it (e.g., from sorting)
 
     Returns:
         Dictionary with images, platforms, and metadata for templates
     """
-    dependencies = extract_dependencies(images)
+    if dependencies is None:
+        dependencies = extract_dependencies(images)
     image_names = {img.name for img in images}
     depths = _calculate_depths(image_names, dependencies)
     max_depth = max(depths.values()) if depths else 0
 
-    # Deduplicate images by name (keep first occurrence, merge tags)
-    seen_names = {}
+    # Group images by name (multiple image.yml can share a name), keeping
+    # first-occurrence order, then build one context per name with merged tags
+    by_name: dict[str, list] = {}
     for image in images:
-        if image.name in seen_names:
-            # Merge tags from duplicate image
-            seen_names[image.name]["tags"].extend([tag.name for tag in image.tags])
-            continue
-
-        # Get direct dependencies (other images this one depends on)
-        deps = [d for d in dependencies.get(image.name, set())
-                if d in image_names]
-
-        # Collect all tag names including variant tags
-        tag_names = [tag.name for tag in image.tags]
-
-        seen_names[image.name] = {
-            "name": image.name,
-            "dependencies": sorted(deps),
-            "tags": tag_names,
-            "depth": depths[image.name],
+        by_name.setdefault(image.name, []).append(image)
+
+    image_contexts = [
+        {
+            "name": name,
+            # Direct dependencies (other images this one depends on)
+            "dependencies": sorted(dependencies.get(name, set()) & image_names),
+            "tags": [tag.name for image in group for tag in image.tags],
+            "depth": depths[name],
         }
-
-    image_contexts = list(seen_names.values())
+        for name, group in by_name.items()
+    ]
 
     # Sort images by depth, then by name for consistent ordering
     sorted_by_depth = sorted(image_contexts, key=lambda x: (x["depth"], x["name"]))
 
     # Generate stage names: build-<image>, manifest-<image> for each image in order
-    stages = []
-    for img in sorted_by_depth:
-        stages.append(f"build-{img['name']}")
-        stages.append(f"manifest-{img['name']}")
+    stages = [stage for img in sorted_by_depth for stage in (f"build-{img['name']}", f"manifest-{img['name']}")]
     stages.append("test")
 
     context = {
@@ -107,8 +125,29 @@ def build_ci_context(images: list, artifacts: bool = False, ci_image: str | None
     return context
 
 
+def _write_template(template, context: dict, output_path: Path) -> None:
+    """Stream a rendered template to output_path via a temp file and rename.
+
+    A template error halfway through leaves the previous file intact
+    instead of a truncated one.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("w", encoding="utf-8") as f:
+            template.stream(**context).dump(f)
+        os.replace(tmp, output_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
 def generate_gitlab_ci(
-    images: list, output_path: Path, artifacts: bool = False, ci_image: str | None = None
+    images: list,
+    output_path: Path,
+    artifacts: bool = False,
+    ci_image: str | None = None,
+    dependencies: dict[str, set[str]] | None = None,
 ) -> None:
     """Generate GitLab CI configuration file.
 
@@ -117,21 +156,22 @@ def generate_gitlab_ci(
         output_path: Path to write the generated CI config
         artifacts: Whether to enable artifact passing between jobs
         ci_image: Docker image for CI jobs (optional)
+        dependencies: Optional result of extract_dependencies(images)
     """
-    env = Environment(
-        loader=FileSystemLoader(TEMPLATES_DIR / "gitlab"),
-        keep_trailing_newline=True,
-    )
+    env = _get_env(TEMPLATES_DIR / "gitlab")
     template = env.get_template("pipeline.yml.j2")
 
-    context = build_ci_context(images, artifacts=artifacts, ci_image=ci_image)
+    context = build_ci_context(images, artifacts=artifacts, ci_image=ci_image, dependencies=dependencies)
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(template.render(**context))
+    _write_template(template, context, output_path)
 
 
 def generate_github_ci(
-    images: list, output_path: Path, artifacts: bool = False, ci_image: str | None = None
+    images: list,
+    output_path: Path,
+    artifacts: bool = False,
+    ci_image: str | None = None,
+    dependencies: dict[str, set[str]] | None = None,
 ) -> None:
     """Generate GitHub Actions workflow file.
 
@@ -140,20 +180,22 @@ def generate_github_ci(
         output_path: Path to write the generated workflow
         artifacts: Whether to enable artifact passing between jobs
         ci_image: Docker image for CI jobs (optional)
+        dependencies: Optional result of extract_dependencies(images)
     """
-    env = Environment(
-        loader=FileSystemLoader(TEMPLATES_DIR / "github"),
-        keep_trailing_newline=True,
-    )
+    env = _get_env(TEMPLATES_DIR / "github")
     template = env.get_template("workflow.yml.j2")
 
-    context = build_ci_context(images, artifacts=artifacts, ci_image=ci_image)
+    context = build_ci_context(images, artifacts=artifacts, ci_image=ci_image, dependencies=dependencies)
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(template.render(**context))
+    _write_template(template, context, output_path)
 
 
-def build_extended_context(images: list, artifacts: bool = False, ci_image: str | None = None) -> dict:
+def build_extended_context(
+    images: list,
+    artifacts: bool = False,
+    ci_image: str | None = None,
+    dependencies: dict[str, set[str]] | None = None,
+) -> dict:
     """Build extended context dictionary for custom CI templates.
 
     Includes all standard context plus configuration values.
@@ -162,19 +204,13 @@ def build_extended_context(images: list, artifacts: bool = False, ci_image: str
         images: List of Image objects (should be in dependency order)
         artifacts: Whether to enable artifact passing between jobs
         ci_image: Docker image for CI jobs (optional)
+        dependencies: Optional result of extract_dependencies(images)
 
     Returns:
         Dictionary with images, platforms, metadata, and config for templates
     """
-    from manager.config import (
-        get_registry_url,
-        get_registries,
-        get_cache_config,
-        get_labels_config,
-    )
-
     # Start with standard context
-    context = build_ci_context(images, artifacts=artifacts, ci_image=ci_image)
+    context = build_ci_context(images, artifacts=artifacts, ci_image=ci_image, dependencies=dependencies)
 
     # Add config section with registry, cache, and labels info
     registries = get_registries()
@@ -214,6 +250,7 @@ def generate_custom_ci(
     output_path: Path,
     artifacts: bool = False,
     ci_image: str | None = None,
+    dependencies: dict[str, set[str]] | None = None,
 ) -> None:
     """Generate CI configuration from a custom template directory.
 
@@ -226,6 +263,7 @@ def generate_custom_ci(
         output_path: Path to write the generated CI config
         artifacts: Whether to enable artifact passing between jobs
         ci_image: Docker image for CI jobs (optional)
+        dependencies: Optional result of extract_dependencies(images)
 
     Raises:
         FileNotFoundError: If template_dir doesn't exist or missing main template
@@ -241,13 +279,9 @@ def generate_custom_ci(
             f"Main template '{MAIN_TEMPLATE_NAME}' not found in {template_dir}"
         )
 
-    env = Environment(
-        loader=FileSystemLoader(template_dir),
-        keep_trailing_newline=True,
-    )
+    env = _get_env(template_dir)
     template = env.get_template(MAIN_TEMPLATE_NAME)
 
-    context = build_extended_context(images, artifacts=artifacts, ci_image=ci_image)
+    context = build_extended_context(images, artifacts=artifacts, ci_image=ci_image, dependencies=dependencies)
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(template.render(**context))
+    _write_template(template, context, output_path)
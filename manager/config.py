@@ -1,12 +1,10 @@
 """Configuration loading from .image-manager.yml."""
 
 import os
-import re
+from functools import lru_cache, wraps
 from pathlib import Path
 
-import yaml
 from pydantic import BaseModel
-from pydantic_yaml import parse_yaml_file_as
 
 _config_cache: dict | None = None
 
@@ -49,12 +47,102 @@ class RegistryConfig:
         return (self.username, self.password)
 
 
+# YAML 1.2 core schema scalars (as resolved by ruamel.yaml, which pydantic-yaml
+# used before): only true/false are bools, and 1:30 is a string, not a
+# sexagesimal int
+_YAML_BOOL_RE = r"^(?:true|True|TRUE|false|False|FALSE)$"
+_YAML_INT_RE = r"^(?:[-+]?0b[0-1_]+|[-+]?0o?[0-7_]+|[-+]?[0-9_]+|[-+]?0x[0-9a-fA-F_]+)$"
+_YAML_FLOAT_RE = (
+    r"^(?:[-+]?(?:[0-9][0-9_]*)\.[0-9_]*(?:[eE][-+]?[0-9]+)?"
+    r"|[-+]?(?:[0-9][0-9_]*)(?:[eE][-+]?[0-9]+)"
+    r"|[-+]?\.[0-9_]+(?:[eE][-+][0-9]+)?"
+    r"|[-+]?\.(?:inf|Inf|INF)"
+    r"|\.(?:nan|NaN|NAN))$"
+)
+
+
+@lru_cache(maxsize=None)
+def _yaml_loader():
+    """Build a YAML 1.2 safe loader on top of PyYAML's (libyaml-backed) loader.
+
+    PyYAML only implements YAML 1.1, where yes/no/on/off are bools and 1:30
+    is an int. The parser stays the same; only the implicit bool/int/float
+    resolvers and the int constructor are replaced.
+    """
+    import re
+
+    import yaml
+
+    base = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # PyYAML without libyaml
+    tags = {f"tag:yaml.org,2002:{name}" for name in ("bool", "int", "float")}
+
+    def construct_int(loader, node):
+        value = loader.construct_scalar(node).replace("_", "")
+        sign = -1 if value.startswith("-") else 1
+        value = value.lstrip("+-")
+        radix = {"0b": 2, "0o": 8, "0x": 16}.get(value[:2])
+        return sign * (int(value[2:], radix) if radix else int(value, 10))
+
+    class Loader(base):
+        yaml_implicit_resolvers = {
+            first: [(tag, regexp) for tag, regexp in resolvers if tag not in tags]
+            for first, resolvers in base.yaml_implicit_resolvers.items()
+        }
+
+    Loader.add_implicit_resolver("tag:yaml.org,2002:bool", re.compile(_YAML_BOOL_RE), list("tTfF"))
+    Loader.add_implicit_resolver("tag:yaml.org,2002:int", re.compile(_YAML_INT_RE), list("-+0123456789"))
+    Loader.add_implicit_resolver("tag:yaml.org,2002:float", re.compile(_YAML_FLOAT_RE), list("-+0123456789."))
+    Loader.add_constructor("tag:yaml.org,2002:int", construct_int)
+    return Loader
+
+
+def _load_yaml(path: Path):
+    """Parse a YAML file with YAML 1.2 scalar typing, using libyaml if available.
+
+    The file is handed to the loader as a stream, so it is parsed without
+    first reading it into one string.
+
+    yaml is imported on first use, so importing this module doesn't pay for
+    it when no config is read.
+    """
+    import yaml
+
+    with path.open("rb") as f:
+        return yaml.load(f, Loader=_yaml_loader())
+
+
 def clear_config_cache() -> None:
     """Clear the config cache. Useful for testing."""
     global _config_cache
     _config_cache = None
 
 
+@lru_cache(maxsize=256)
+def _parse_env_refs(value: str) -> tuple[tuple[tuple[str, str], ...], str]:
+    """Split a value into ${NAME} references in a single left-to-right scan.
+
+    Only the parsing is cached; env vars are looked up on every expansion.
+    Values derived from the config through _cached_per_config are
+    recomputed when a referenced env var changes.
+
+    Returns:
+        Tuple of ((literal prefix, env var name), ...) and the trailing literal
+    """
+    refs = []
+    literal_start = pos = 0
+    while (start := value.find("${", pos)) != -1:
+        end = value.find("}", start + 2)
+        if end == -1:
+            break
+        pos = end + 1
+        if end == start + 2:
+            # Empty ${} is kept literally
+            continue
+        refs.append((value[literal_start:start], value[start + 2:end]))
+        literal_start = pos
+    return tuple(refs), value[literal_start:]
+
+
 def expand_env_vars(value: str | None) -> str | None:
     """Expand ${VAR} references in a string value.
 
@@ -65,31 +153,22 @@ def expand_env_vars(value: str | None) -> str | None:
 
     Returns None if the value is None or any referenced env var is undefined.
     """
-    if value is None:
-        return None
-
-    if not value:
+    # Most values have no env var reference at all
+    if not value or "${" not in value:
         return value
 
-    # Find all ${VAR} patterns
-    pattern = r'\$\{([^}]+)\}'
-    matches = list(re.finditer(pattern, value))
-
-    if not matches:
-        # No env var pattern found, return as-is
-        return value
-
-    # Expand all env vars
-    result = value
-    for match in reversed(matches):  # Reverse to preserve positions during replacement
-        var_name = match.group(1)
+    refs, tail = _parse_env_refs(value)
+    parts = []
+    for literal, var_name in refs:
         env_value = os.environ.get(var_name)
         if env_value is None:
             # Undefined env var - return None
             return None
-        result = result[:match.start()] + env_value + result[match.end():]
+        parts.append(literal)
+        parts.append(env_value)
+    parts.append(tail)
 
-    return result
+    return "".join(parts)
 
 
 def load_config() -> dict:
@@ -110,14 +189,49 @@ def load_config() -> dict:
         return _config_cache
 
     try:
-        content = config_path.read_text()
-        _config_cache = yaml.safe_load(content) or {}
+        _config_cache = _load_yaml(config_path) or {}
     except Exception:
         _config_cache = {}
 
     return _config_cache
 
 
+def _config_env_names(value) -> tuple[str, ...]:
+    """Collect the names of all ${NAME} references in a loaded config."""
+    if isinstance(value, str):
+        if "${" not in value:
+            return ()
+        return tuple(name for _, name in _parse_env_refs(value)[0])
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, list):
+        return ()
+    return tuple(dict.fromkeys(name for item in value for name in _config_env_names(item)))
+
+
+def _cached_per_config(func):
+    """Cache a value derived from the loaded config.
+
+    The value is recomputed whenever load_config() returns a different
+    object, i.e. after clear_config_cache(), or when one of the env vars
+    the config references changes.
+    """
+    cached = None
+
+    @wraps(func)
+    def wrapper():
+        nonlocal cached
+        config = load_config()
+        if cached is None or cached[0] is not config:
+            cached = (config, _config_env_names(config), None, None)
+        env = tuple(os.environ.get(name) for name in cached[1])
+        if cached[2] != env:
+            cached = (config, cached[1], env, func())
+        return cached[3]
+
+    return wrapper
+
+
 def get_registry_url() -> str:
     """Get the URL of the default push registry.
 
@@ -193,6 +307,7 @@ def get_registry_auth() -> tuple[str, str] | None:
     return (expanded_username, expanded_password)
 
 
+@_cached_per_config
 def get_registries() -> list[RegistryConfig]:
     """Get all configured registries.
 
@@ -204,17 +319,18 @@ def get_registries() -> list[RegistryConfig]:
     # Check new multi-registry format
     registries_config = config.get("registries", [])
     if registries_config:
-        result = []
-        for reg in registries_config:
-            url = expand_env_vars(reg.get("url"))
-            if not url:
-                continue
-            username = expand_env_vars(reg.get("username"))
-            password = expand_env_vars(reg.get("password"))
-            default = reg.get("default", False)
-            insecure = reg.get("insecure")  # None means auto-detect
-            result.append(RegistryConfig(url, username, password, default, insecure))
-        return result
+        expand = expand_env_vars
+        return [
+            RegistryConfig(
+                url,
+                expand(reg.get("username")),
+                expand(reg.get("password")),
+                reg.get("default", False),
+                reg.get("insecure"),  # None means auto-detect
+            )
+            for reg in registries_config
+            if (url := expand(reg.get("url")))
+        ]
 
     # Fall back to legacy single registry format
     registry = config.get("registry", {})
@@ -230,6 +346,7 @@ def get_registries() -> list[RegistryConfig]:
     return [RegistryConfig(url, username, password, default=True, insecure=insecure)]
 
 
+@_cached_per_config
 def get_push_registry() -> RegistryConfig:
     """Get the registry to push images to (marked as default).
 
@@ -262,10 +379,11 @@ def get_registry_auth_for(registry_url: str) -> tuple[str, str] | None:
         (username, password) tuple if found, None otherwise
     """
     registries = get_registries()
+    host = registry_url.partition("/")[0]
 
     for reg in registries:
         # Match by URL prefix
-        if registry_url.startswith(reg.url) or reg.url.startswith(registry_url.split("/")[0]):
+        if registry_url.startswith(reg.url) or reg.url.startswith(host):
             return reg.get_auth()
 
     return None
@@ -301,6 +419,7 @@ DEFAULT_CACHE_ACCESS_KEY = "GK31337cafe000000000000000"
 DEFAULT_CACHE_SECRET_KEY = "1337cafe0000000000000000000000000000000000000000000000000000dead"
 
 
+@_cached_per_config
 def get_cache_config() -> CacheConfig | None:
     """Get S3 cache configuration.
 
@@ -491,15 +610,38 @@ class ImageConfig(BaseModel):
     aliases: dict[str, str] = {}
     rootfs_user: str | None = None
     rootfs_copy: bool | None = None
+    auto_dockerignore: bool = True
+    cache_mounts: bool = False
     # OCI labels
     description: str | None = None  # org.opencontainers.image.description
     licenses: str | None = None  # org.opencontainers.image.licenses (overrides global)
 
 
+_image_config_cache: dict[Path, tuple[tuple[int, int], ImageConfig]] = {}
+
+
 class ConfigLoader:
     """Loads and validates image.yml files"""
 
     @staticmethod
     def load(path: Path) -> ImageConfig:
-        """Load and validate an image.yml file"""
-        return parse_yaml_file_as(ImageConfig, path)
+        """Load and validate an image.yml file
+
+        Parsed configs are cached per file and reused while its mtime and
+        size are unchanged.
+        """
+        key = path.resolve()
+        st = key.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _image_config_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        config = ImageConfig.model_validate(_load_yaml(path))
+        _image_config_cache[key] = (stamp, config)
+        return config
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Clear the parsed config cache. Useful for testing."""
+        _image_config_cache.clear()
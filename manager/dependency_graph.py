@@ -1,8 +1,18 @@
+import mmap
 import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Set
 from pathlib import Path
 from graphlib import TopologicalSorter
 
+_BASE_IMAGE_REF_RE = re.compile(r'\{\{\s*["\']([^"\']+)["\']\s*\|\s*resolve_base_image\s*\}\}')
+_BASE_IMAGE_REF_BYTES_RE = re.compile(_BASE_IMAGE_REF_RE.pattern.encode())
+
+# Templates smaller than this are read into a string; mmap setup costs more
+_MMAP_MIN_SIZE = 64 * 1024
+
 
 class CyclicDependencyError(Exception):
     """Raised when a circular dependency is detected in the image dependency graph."""
@@ -23,9 +33,31 @@ def extract_base_image_refs(template_content: str) -> Set[str]:
     Returns:
         Set of base image names referenced in the template
     """
-    pattern = r'\{\{\s*["\']([^"\']+)["\']\s*\|\s*resolve_base_image\s*\}\}'
-    matches = re.findall(pattern, template_content)
-    return set(matches)
+    return set(_BASE_IMAGE_REF_RE.findall(template_content))
+
+
+@lru_cache(maxsize=1024)
+def _template_refs(path: Path, mtime_ns: int, size: int) -> frozenset[str]:
+    """Base image references of a template file.
+
+    Cached by path and (mtime, size), so templates shared between images or
+    variants, or analysed again in the same run, are read only once.
+    """
+    if size < _MMAP_MIN_SIZE:
+        return frozenset(extract_base_image_refs(path.read_text()))
+
+    # Scan large templates in place instead of decoding the whole file
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return frozenset(ref.decode() for ref in _BASE_IMAGE_REF_BYTES_RE.findall(mm))
+
+
+def get_template_refs(template_path: Path) -> frozenset[str]:
+    """Get base image references of a template, or an empty set if it doesn't exist."""
+    try:
+        st = template_path.stat()
+    except FileNotFoundError:
+        return frozenset()
+    return _template_refs(template_path, st.st_mtime_ns, st.st_size)
 
 
 def extract_dependencies(images: list) -> dict[str, Set[str]]:
@@ -43,23 +75,28 @@ def extract_dependencies(images: list) -> dict[str, Set[str]]:
     Returns:
         Dictionary mapping image name to set of dependencies (other image names it depends on)
     """
+    # Read and scan all distinct templates concurrently (I/O bound)
+    template_paths = list(dict.fromkeys(
+        path
+        for image in images
+        for path in [image.template_path, *(variant.template_path for variant in image.variants)]
+    ))
+    template_refs = {}
+    if template_paths:
+        with ThreadPoolExecutor(max_workers=min(32, len(template_paths))) as executor:
+            template_refs = dict(zip(template_paths, executor.map(get_template_refs, template_paths)))
+
     dependencies = {}
 
     for image in images:
         deps = set()
 
         # Parse main template for base image references
-        template_path = image.template_path
-        if template_path.exists():
-            template_content = template_path.read_text()
-            # Extract base image references from the template
-            deps.update(extract_base_image_refs(template_content))
+        deps.update(template_refs[image.template_path])
 
         # Parse variant templates
         for variant in image.variants:
-            if variant.template_path.exists():
-                variant_content = variant.template_path.read_text()
-                deps.update(extract_base_image_refs(variant_content))
+            deps.update(template_refs[variant.template_path])
 
         # Include extends field if present
         if image.extends:
@@ -98,7 +135,7 @@ def topological_sort(dependencies: dict[str, Set[str]]) -> list[str]:
         ) from e
 
 
-def sort_images(images: list) -> list:
+def sort_images(images: list, dependencies: dict[str, Set[str]] | None = None) -> list:
     """
     Sort images in build order (dependencies built before dependents).
 
@@ -108,6 +145,8 @@ def sort_images(images: list) -> list:
 
     Args:
         images: List of Image objects to sort
+        dependencies: Optional result of extract_dependencies(images), if the
+                      caller already has it
 
     Returns:
         List of Image objects sorted in topological order (build order)
@@ -116,22 +155,22 @@ def sort_images(images: list) -> list:
         CyclicDependencyError: If a circular dependency is detected
     """
     # Extract dependencies from images
-    dependencies = extract_dependencies(images)
+    if dependencies is None:
+        dependencies = extract_dependencies(images)
 
     # Perform topological sort to get names in build order
     sorted_names = topological_sort(dependencies)
 
     # Create a mapping from name to list of images (multiple image.yml can have same name)
-    image_map: dict[str, list] = {}
+    image_map: defaultdict[str, list] = defaultdict(list)
     for image in images:
-        if image.name not in image_map:
-            image_map[image.name] = []
         image_map[image.name].append(image)
 
     # Map sorted names back to Image objects (include all images with same name)
     sorted_images = []
     for name in sorted_names:
-        if name in image_map:
-            sorted_images.extend(image_map[name])
+        # External dependencies appear in sorted_names but have no images;
+        # .get() avoids inserting them into the defaultdict
+        sorted_images.extend(image_map.get(name, ()))
 
     return sorted_images
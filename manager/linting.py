@@ -1,24 +1,34 @@
 """Dockerfile linting using hadolint."""
 
+import os
 import platform
+import pty
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+# (system, machine) as reported by the platform module -> bin/ subdirectory
+_PLATFORM_DIRS = {
+    ("darwin", "arm64"): "darwin-arm64",
+    ("linux", "x86_64"): "linux-amd64",
+    ("linux", "amd64"): "linux-amd64",
+    ("linux", "arm64"): "linux-arm64",
+    ("linux", "aarch64"): "linux-arm64",
+}
 
+
+@lru_cache(maxsize=None)
 def get_bin_path() -> Path:
     """Get the path to the bin directory for the current platform."""
     system = platform.system().lower()
     machine = platform.machine().lower()
 
-    if system == "darwin" and machine == "arm64":
-        platform_dir = "darwin-arm64"
-    elif system == "linux" and machine in ("x86_64", "amd64"):
-        platform_dir = "linux-amd64"
-    elif system == "linux" and machine in ("arm64", "aarch64"):
-        platform_dir = "linux-arm64"
-    else:
-        raise RuntimeError(f"Unsupported platform: {system}-{machine}")
+    try:
+        platform_dir = _PLATFORM_DIRS[(system, machine)]
+    except KeyError:
+        raise RuntimeError(f"Unsupported platform: {system}-{machine}") from None
 
     bin_path = Path(__file__).parent.parent / "bin" / platform_dir
     if not bin_path.exists():
@@ -26,6 +36,7 @@ def get_bin_path() -> Path:
     return bin_path
 
 
+@lru_cache(maxsize=None)
 def get_hadolint_path() -> Path:
     """Get the path to the hadolint binary."""
     binary = get_bin_path() / "hadolint"
@@ -34,50 +45,173 @@ def get_hadolint_path() -> Path:
     return binary
 
 
-def run_lint(
-    image_ref: str,
+def _hadolint_cmd(format: str, strict: bool) -> list[str]:
+    """Build the hadolint command line without the Dockerfile paths."""
+    cmd = [str(get_hadolint_path())]
+
+    # Add format option
+    if format != "tty":
+        cmd.extend(["--format", format])
+
+    # Add strict mode (fail on warnings)
+    if strict:
+        cmd.extend(["--failure-threshold", "warning"])
+
+    return cmd
+
+
+def _dockerfile_path(image_ref: str) -> str:
+    """Get the generated Dockerfile path for an image reference."""
+    if ":" not in image_ref:
+        raise ValueError(f"Invalid image reference '{image_ref}', expected format: name:tag")
+
+    name, tag = image_ref.split(":", 1)
+    return os.path.join("dist", name, tag, "Dockerfile")
+
+
+def run_lint_many(
+    image_refs: list[str],
     format: str = "tty",
     strict: bool = False,
 ) -> int:
-    """Run hadolint on a Dockerfile.
+    """Run hadolint once on the Dockerfiles of several images.
+
+    hadolint accepts multiple paths, so this avoids starting one process
+    per image. Findings are reported with the Dockerfile path they belong to.
 
     Args:
-        image_ref: Image reference in format 'name:tag'
+        image_refs: Image references in format 'name:tag'
         format: Output format (tty, json, checkstyle, sarif)
         strict: Treat warnings as errors
 
     Returns:
-        Exit code from hadolint (0 = pass, 1 = lint errors)
+        Exit code from hadolint, or 1 if any Dockerfile is missing
     """
-    if ":" not in image_ref:
-        raise ValueError(f"Invalid image reference '{image_ref}', expected format: name:tag")
+    paths = []
+    missing = False
+    for image_ref in image_refs:
+        dockerfile_path = _dockerfile_path(image_ref)
+        if os.path.isfile(dockerfile_path):
+            paths.append(dockerfile_path)
+        else:
+            print(f"Error: Dockerfile not found: {dockerfile_path}", file=sys.stderr)
+            missing = True
+
+    if missing:
+        print("Run 'image-manager generate' first.", file=sys.stderr)
+    if not paths:
+        return 1
 
-    name, tag = image_ref.split(":", 1)
-    dockerfile_path = Path("dist") / name / tag / "Dockerfile"
+    cmd = _hadolint_cmd(format, strict) + paths
 
-    if not dockerfile_path.exists():
-        print(f"Error: Dockerfile not found: {dockerfile_path}", file=sys.stderr)
-        print(f"Run 'image-manager generate' first.", file=sys.stderr)
-        return 1
+    # Flush stdout before running to ensure proper output ordering
+    print(f"Linting {len(paths)} Dockerfile(s)...", flush=True)
+    result = subprocess.run(cmd)
 
-    hadolint = get_hadolint_path()
-    cmd = [str(hadolint)]
+    if result.returncode == 0 and not missing:
+        print("  No issues found")
 
-    # Add format option
-    if format != "tty":
-        cmd.extend(["--format", format])
+    return result.returncode or int(missing)
 
-    # Add strict mode (fail on warnings)
-    if strict:
-        cmd.extend(["--failure-threshold", "warning"])
 
-    cmd.append(str(dockerfile_path))
+def _run_on_pty(cmd: list[str]) -> tuple[int, str]:
+    """Run a command with its output captured through a pseudo-terminal.
 
-    # Flush stdout before running to ensure proper output ordering
-    print(f"Linting {image_ref}...", flush=True)
-    result = subprocess.run(cmd)
+    hadolint only colors its tty report when writing to a terminal; a pty
+    keeps the colors while the output is still collected per process.
+    """
+    master, slave = pty.openpty()
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=slave, stderr=slave)
+    finally:
+        os.close(slave)
+
+    chunks = []
+    try:
+        while True:
+            try:
+                data = os.read(master, 65536)
+            except OSError:  # EIO once the child has closed the terminal
+                break
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        os.close(master)
+
+    # The terminal translates \n to \r\n
+    output = b"".join(chunks).decode(errors="replace").replace("\r\n", "\n")
+    return proc.wait(), output
+
+
+def _lint_one(base_cmd: list[str], dockerfile_path: str, capture: bool = True, color: bool = False) -> tuple[int, str]:
+    """Lint one Dockerfile, with captured output for use from worker threads.
+
+    Without capture, hadolint writes straight to the terminal and the
+    returned output is empty. With color, captured output goes through a
+    pseudo-terminal so hadolint keeps its colors.
+    """
+    cmd = base_cmd + [dockerfile_path]
+    if not capture:
+        return subprocess.run(cmd).returncode, ""
+    if color:
+        return _run_on_pty(cmd)
 
-    if result.returncode == 0:
-        print(f"  No issues found")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return result.returncode, result.stdout
 
-    return result.returncode
+
+def run_lint_each(
+    image_refs: list[str],
+    format: str = "tty",
+    strict: bool = False,
+) -> list[str]:
+    """Run hadolint per image concurrently, keeping per-image results.
+
+    Output is captured per process and printed in input order once all
+    runs have finished, so reports of different images never interleave.
+    A single image has nothing to interleave with, so hadolint then writes
+    straight to the terminal, keeping its colors and live output.
+
+    Args:
+        image_refs: Image references in format 'name:tag'
+        format: Output format (tty, json, checkstyle, sarif)
+        strict: Treat warnings as errors
+
+    Returns:
+        Image references that failed linting
+    """
+    base_cmd = _hadolint_cmd(format, strict)
+    paths = {image_ref: _dockerfile_path(image_ref) for image_ref in image_refs}
+    found = [image_ref for image_ref in image_refs if os.path.isfile(paths[image_ref])]
+    stream = len(image_refs) == 1
+    color = format == "tty" and sys.stdout.isatty()
+
+    if stream:
+        print(f"Linting {image_refs[0]}...", flush=True)
+        results = {ref: _lint_one(base_cmd, paths[ref], capture=False) for ref in found}
+    else:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            outputs = executor.map(lambda ref: _lint_one(base_cmd, paths[ref], color=color), found)
+            results = dict(zip(found, outputs))
+
+    failed = []
+    for image_ref in image_refs:
+        if not stream:
+            print(f"Linting {image_ref}...", flush=True)
+        if image_ref not in results:
+            print(f"Error: Dockerfile not found: {paths[image_ref]}", file=sys.stderr, flush=True)
+            failed.append(image_ref)
+            continue
+        returncode, output = results[image_ref]
+        if output:
+            print(output, end="")
+        if returncode == 0:
+            print("  No issues found")
+        else:
+            failed.append(image_ref)
+
+    if len(found) < len(image_refs):
+        print("Run 'image-manager generate' first.", file=sys.stderr)
+
+    return failed
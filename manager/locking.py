@@ -1,23 +1,77 @@
 """Package locking for reproducible builds."""
 
+import gzip
+import hashlib
+import http.client
 import platform
 import re
+import shlex
 import subprocess
-import urllib.request
+import sys
+import threading
+import urllib.error
 import urllib.parse
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
-import yaml
-
-from manager.config import get_registries
+from manager.config import _load_yaml, get_registries
 
 # Lock file format version - increment when format changes
 LOCK_VERSION = 1
 
-
+# Persistent cache for package version and image digest lookups
+LOOKUP_CACHE_PATH = Path("dist") / ".lock-cache.json"
+# JSON copies of parsed packages.lock files, see _load_lock_via_json
+LOCK_JSON_CACHE_DIR = Path("dist") / ".lock-json"
+PACKAGE_VERSION_TTL = 6 * 60 * 60
+IMAGE_DIGEST_TTL = 15 * 60
+IMAGE_DISTRO_TTL = 7 * 24 * 60 * 60
+
+# Concurrent packages.ubuntu.com lookups; requests are latency-bound, not CPU-bound
+PACKAGE_LOOKUP_WORKERS = 32
+
+# Docker Hub registry API, used to resolve digests without starting crane
+DOCKER_HUB_AUTH_URL = "https://auth.docker.io/token"
+DOCKER_HUB_REGISTRY_URL = "https://registry-1.docker.io"
+_MANIFEST_ACCEPT = ", ".join([
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+])
+
+# Ubuntu archive indices used to resolve many package versions at once,
+# per architecture of the supported build platforms (arm64 lives on the
+# ports archive). Later pockets take precedence; packages outside these
+# components fall back to per-package lookups on packages.ubuntu.com.
+ARCHIVE_URLS = {
+    "amd64": "https://archive.ubuntu.com/ubuntu",
+    "arm64": "https://ports.ubuntu.com/ubuntu-ports",
+}
+ARCHIVE_POCKETS = ("", "-security", "-updates")
+ARCHIVE_COMPONENTS = ("main", "restricted")
+_PACKAGES_INDEX_RE = re.compile(rb"^(Package|Version): (\S+)$", re.MULTILINE)
+
+# Page title on packages.ubuntu.com, e.g. "Package: curl (8.5.0-2ubuntu10.6 and others)"
+_PKG_TITLE_RE = re.compile(r"Package:\s*\S+\s*\(([^)]+)\)")
+_APT_COMMANDS = ("apt-get", "apt")
+# apt options that consume the following word, e.g. "-o Dpkg::Options::=--force-confold"
+_APT_VALUE_OPTIONS = ("-o", "-t", "-c", "--option", "--target-release", "--config-file")
+_PACKAGE_NAME_RE = re.compile(r"[a-z0-9][a-z0-9+.-]+(?::[a-z0-9-]+)?")
+_SHELL_PUNCTUATION = "();<>|&"
+_APT_INSTALL_RE = re.compile(r"apt-get\s+install\s+(?:-[a-zA-Z]+\s+)*(.+?)(?:\s*&&|\s*$|\s*;)", re.MULTILINE | re.IGNORECASE)
+# FROM ubuntu:24.04 -> ("ubuntu", "24.04"), FROM ubuntu@sha256:abc123 -> ("ubuntu", "sha256:abc123")
+_FROM_REF_RE = re.compile(r"^(FROM\s+)(\S+)(\s+AS\s+\w+)?$", re.IGNORECASE)
+_FROM_LINE_RE = re.compile(r"^FROM\s+([^\s:@]+)(?:[:@]([^\s]+))?(?:\s+AS\s+\w+)?$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
 def _get_bin_platform() -> str:
     """Get the platform directory for bundled binaries."""
     system = platform.system().lower()
@@ -33,11 +87,13 @@ def _get_bin_platform() -> str:
         return f"{system}-{arch}"
 
 
+@lru_cache(maxsize=None)
 def get_crane_path() -> Path:
     """Get the path to the crane binary."""
     return Path(__file__).parent.parent / "bin" / _get_bin_platform() / "crane"
 
 
+@lru_cache(maxsize=None)
 def get_syft_path() -> Path:
     """Get the path to the syft binary."""
     return Path(__file__).parent.parent / "bin" / _get_bin_platform() / "syft"
@@ -83,9 +139,16 @@ def login_to_registries() -> None:
                 print(f"Authenticated to: {registry_host}")
 
 
+# One lock per scanned tar, so concurrent callers share a single syft run
+_distro_locks: dict[str, threading.Lock] = {}
+
+
 def extract_distro_from_image(image_tar: Path) -> dict | None:
     """Extract distro information from an image tar using syft.
 
+    Results are cached by tar path, size and mtime, in memory and in the
+    persistent lookup cache, so an unchanged tar is only scanned once.
+
     Args:
         image_tar: Path to the image tar file
 
@@ -96,19 +159,42 @@ def extract_distro_from_image(image_tar: Path) -> dict | None:
     if not syft.exists():
         return None
 
-    if not image_tar.exists():
+    try:
+        stat = image_tar.stat()
+    except FileNotFoundError:
         return None
 
+    key = f"{image_tar.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    with _lookup_cache_lock:
+        lock = _distro_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        cached = _cached_lookup("distros", key, IMAGE_DISTRO_TTL)
+        if cached:
+            return cached
+
+        distro = _scan_distro(syft, image_tar)
+        if distro:
+            _store_lookup("distros", key, distro)
+        return distro
+
+
+def _scan_distro(syft: Path, image_tar: Path) -> dict | None:
+    """Run syft on an image tar and return its distro fields."""
     try:
+        # Only OS package catalogers - distro detection doesn't need language packages
         result = subprocess.run(
-            [str(syft), "scan", f"docker-archive:{image_tar}", "-o", "json", "-q"],
-            capture_output=True,
-            text=True,
+            [
+                str(syft), "scan", f"docker-archive:{image_tar}",
+                "--override-default-catalogers", "os",
+                "-o", "json", "-q",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             timeout=60,
         )
         if result.returncode == 0:
-            data = json.loads(result.stdout)
-            distro = data.get("distro", {})
+            distro = json.loads(result.stdout).get("distro") or {}
             if distro:
                 return {
                     "id": distro.get("id"),
@@ -121,8 +207,117 @@ def extract_distro_from_image(image_tar: Path) -> dict | None:
         return None
 
 
+def _atomic_write_text(path: Path, data: str) -> None:
+    """Write a file via a temp file and rename, so readers never see a partial write.
+
+    The temp file is created with the usual umask-based permissions, which
+    matters for lock files that end up in version control.
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+_lookup_cache: dict[str, dict[str, list]] | None = None
+_lookup_cache_dirty = False
+_lookup_cache_lock = threading.Lock()
+
+
+def _get_lookup_cache() -> dict[str, dict[str, list]]:
+    """Load the persistent lookup cache on first use."""
+    global _lookup_cache
+
+    with _lookup_cache_lock:
+        if _lookup_cache is None:
+            try:
+                _lookup_cache = json.loads(LOOKUP_CACHE_PATH.read_text())
+            except (OSError, ValueError):
+                _lookup_cache = {}
+        return _lookup_cache
+
+
+def _cached_lookup(section: str, key: str, ttl: float):
+    """Return a cached lookup result if it is younger than ttl seconds."""
+    entry = _get_lookup_cache().get(section, {}).get(key)
+    if entry and time.time() - entry[1] < ttl:
+        return entry[0]
+    return None
+
+
+def _store_lookup(section: str, key: str, value) -> None:
+    """Remember a lookup result for later runs."""
+    global _lookup_cache_dirty
+
+    cache = _get_lookup_cache()
+    with _lookup_cache_lock:
+        cache.setdefault(section, {})[key] = [value, time.time()]
+        _lookup_cache_dirty = True
+
+
+def clear_lookup_cache() -> None:
+    """Forget all cached lookups so the next ones hit the network.
+
+    Fresh results are written back by save_lookup_cache() as usual.
+    """
+    global _lookup_cache, _lookup_cache_dirty
+
+    with _lookup_cache_lock:
+        _lookup_cache = {}
+        _lookup_cache_dirty = True
+    _archive_cache.clear()
+
+
+def save_lookup_cache() -> None:
+    """Write the lookup cache to disk if it changed."""
+    global _lookup_cache_dirty
+
+    with _lookup_cache_lock:
+        if not _lookup_cache_dirty:
+            return
+        LOOKUP_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(LOOKUP_CACHE_PATH, json.dumps(_lookup_cache))
+        _lookup_cache_dirty = False
+
+
+def _docker_hub_digest(image_ref: str) -> str | None:
+    """Resolve a Docker Hub image reference with a manifest HEAD request.
+
+    Args:
+        image_ref: Image reference like "ubuntu:24.04" or "org/image:tag"
+
+    Returns:
+        Digest from the Docker-Content-Digest header, or None if the
+        reference is not a tagged Docker Hub image
+    """
+    ref = image_ref.removeprefix("docker.io/")
+    first, _, rest = ref.partition("/")
+    if "@" in ref or (rest and ("." in first or ":" in first or first == "localhost")):
+        return None
+
+    name, _, tag = ref.partition(":")
+    repo = name if "/" in name else f"library/{name}"
+
+    token_url = f"{DOCKER_HUB_AUTH_URL}?service=registry.docker.io&scope=repository:{repo}:pull"
+    token = json.loads(_http_get(token_url))["token"]
+
+    headers, _ = _http_request(
+        f"{DOCKER_HUB_REGISTRY_URL}/v2/{repo}/manifests/{tag or 'latest'}",
+        method="HEAD",
+        headers={"Authorization": f"Bearer {token}", "Accept": _MANIFEST_ACCEPT},
+    )
+    return headers.get("Docker-Content-Digest")
+
+
 def resolve_image_digest(image_ref: str) -> str | None:
-    """Resolve an image reference to its digest using crane.
+    """Resolve an image reference to its digest.
+
+    Docker Hub images are resolved through the registry API directly;
+    other registries, and Docker Hub failures such as private images,
+    go through crane.
 
     Args:
         image_ref: Image reference like "ubuntu:24.04"
@@ -130,6 +325,18 @@ def resolve_image_digest(image_ref: str) -> str | None:
     Returns:
         Full digest like "sha256:c35e29c9..." or None if failed
     """
+    cached = _cached_lookup("digests", image_ref, IMAGE_DIGEST_TTL)
+    if cached:
+        return cached
+
+    try:
+        digest = _docker_hub_digest(image_ref)
+    except Exception:
+        digest = None
+    if digest:
+        _store_lookup("digests", image_ref, digest)
+        return digest
+
     crane = get_crane_path()
     if not crane.exists():
         return None
@@ -142,12 +349,79 @@ def resolve_image_digest(image_ref: str) -> str | None:
             timeout=30,
         )
         if result.returncode == 0:
-            return result.stdout.strip()
+            digest = result.stdout.strip()
+            _store_lookup("digests", image_ref, digest)
+            return digest
         return None
     except Exception:
         return None
 
 
+# Keep-alive HTTPS connections, one per (thread, host)
+_http_local = threading.local()
+
+
+def _http_request(
+    url: str,
+    method: str = "GET",
+    headers: dict[str, str] | None = None,
+    timeout: float = 30,
+) -> tuple[http.client.HTTPMessage, bytes]:
+    """Send a request over a reused keep-alive connection.
+
+    Each thread keeps one connection per host, so repeated lookups against
+    the same service skip the TCP and TLS handshakes. A connection the
+    server has closed in the meantime is reopened once.
+
+    Args:
+        url: HTTP(S) URL to request
+        method: HTTP method
+        headers: Extra request headers
+        timeout: Socket timeout in seconds
+
+    Returns:
+        Tuple of (response headers, response body)
+
+    Raises:
+        urllib.error.HTTPError: If the response status is not 200
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += f"?{parts.query}"
+
+    connections = getattr(_http_local, "connections", None)
+    if connections is None:
+        connections = _http_local.connections = {}
+
+    key = (parts.scheme, parts.netloc)
+    connection_class = http.client.HTTPConnection if parts.scheme == "http" else http.client.HTTPSConnection
+
+    for attempt in range(2):
+        conn = connections.get(key)
+        if conn is None:
+            conn = connections[key] = connection_class(parts.netloc, timeout=timeout)
+        try:
+            conn.request(method, path, headers=headers or {})
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            del connections[key]
+            if attempt:
+                raise
+            continue
+
+        if response.status != 200:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        return response.headers, body
+
+
+def _http_get(url: str, timeout: float = 30) -> bytes:
+    """Fetch a URL and return its body, see _http_request."""
+    return _http_request(url, timeout=timeout)[1]
+
+
 # Cache for Ubuntu series data
 _series_cache: dict[str, str] | None = None
 
@@ -168,13 +442,12 @@ def get_ubuntu_codename(version: str) -> str:
 
     if _series_cache is None:
         url = "https://api.launchpad.net/1.0/ubuntu/series"
-        with urllib.request.urlopen(url, timeout=30) as response:
-            data = json.loads(response.read().decode())
-            _series_cache = {
-                entry["version"]: entry["name"]
-                for entry in data["entries"]
-                if entry.get("version")
-            }
+        data = json.loads(_http_get(url))
+        _series_cache = {
+            entry["version"]: entry["name"]
+            for entry in data["entries"]
+            if entry.get("version")
+        }
 
     if version not in _series_cache:
         raise ValueError(f"Unknown Ubuntu version: {version}")
@@ -192,31 +465,229 @@ def get_package_version(package: str, codename: str) -> str | None:
     Returns:
         Version string like "8.5.0-2ubuntu10.6" or None if not found
     """
+    cache_key = f"{codename}/{package}"
+    cached = _cached_lookup("packages", cache_key, PACKAGE_VERSION_TTL)
+    if cached:
+        return cached
+
     # Query packages.ubuntu.com for binary package info
     url = f"https://packages.ubuntu.com/{codename}/{package}"
 
     try:
-        with urllib.request.urlopen(url, timeout=30) as response:
-            html = response.read().decode()
-
-            # Extract version from page title or content
-            # Format: "Package: curl (8.5.0-2ubuntu10.6 and others)"
-            # or "Package: gnupg (2.4.4-2ubuntu17.3)"
-            match = re.search(r"Package:\s*\S+\s*\(([^)]+)\)", html)
-            if match:
-                version_text = match.group(1)
-                # Handle "X.Y.Z and others" format - take first version
-                version = version_text.split(" and ")[0].strip()
-                return version
+        html = _http_get(url).decode()
 
-            return None
+        # Extract version from page title or content
+        # Format: "Package: curl (8.5.0-2ubuntu10.6 and others)"
+        # or "Package: gnupg (2.4.4-2ubuntu17.3)"
+        match = _PKG_TITLE_RE.search(html)
+        if match:
+            version_text = match.group(1)
+            # Handle "X.Y.Z and others" format - take first version
+            version = version_text.split(" and ")[0].strip()
+            _store_lookup("packages", cache_key, version)
+            return version
+
+        return None
 
     except Exception:
         return None
 
 
+# Cache for parsed archive indices per codename
+_archive_cache: dict[str, dict[str, str]] = {}
+
+
+def parse_packages_index(index: bytes) -> dict[str, str]:
+    """Parse an apt Packages index into a package -> version mapping.
+
+    Args:
+        index: Uncompressed Packages file content
+
+    Returns:
+        Dict of package -> version
+    """
+    versions = {}
+    package = None
+    for match in _PACKAGES_INDEX_RE.finditer(index):
+        field, value = match.groups()
+        if field == b"Package":
+            package = value.decode()
+        elif package is not None:
+            versions[package] = value.decode()
+            package = None
+    return versions
+
+
+def parse_release_hashes(release: bytes) -> dict[str, str]:
+    """Parse the SHA256 section of an apt Release file.
+
+    Args:
+        release: Release file content
+
+    Returns:
+        Dict of index path (e.g. "main/binary-amd64/Packages.gz") -> sha256
+    """
+    hashes = {}
+    in_sha256 = False
+    for line in release.decode(errors="replace").splitlines():
+        if not line.startswith(" "):
+            in_sha256 = line.rstrip() == "SHA256:"
+        elif in_sha256:
+            fields = line.split()
+            if len(fields) == 3:
+                hashes[fields[2]] = fields[0]
+    return hashes
+
+
+def _get_pocket_versions(base_url: str, suite: str, arch: str) -> dict[str, str]:
+    """Get package versions from the Packages indices of one archive pocket.
+
+    Every index is checked against the SHA256 listed in the pocket's
+    Release file; indices that cannot be fetched or don't match are skipped.
+    """
+    try:
+        hashes = parse_release_hashes(_http_get(f"{base_url}/dists/{suite}/Release", timeout=60))
+    except Exception:
+        return {}
+
+    versions = {}
+    for component in ARCHIVE_COMPONENTS:
+        path = f"{component}/binary-{arch}/Packages.gz"
+        expected = hashes.get(path)
+        if expected is None:
+            continue
+        try:
+            data = _http_get(f"{base_url}/dists/{suite}/{path}", timeout=60)
+        except Exception:
+            continue
+        if hashlib.sha256(data).hexdigest() != expected:
+            print(f"Warning: checksum mismatch for {base_url}/dists/{suite}/{path}, skipping", file=sys.stderr)
+            continue
+        versions.update(parse_packages_index(gzip.decompress(data)))
+    return versions
+
+
+def get_archive_versions(codename: str) -> dict[str, str]:
+    """Get package versions for a release from the Ubuntu archive indices.
+
+    Downloads the Packages index of every pocket and component once per
+    codename, for every architecture in ARCHIVE_URLS. Only versions that
+    are the same on all architectures are returned, as one pin is applied
+    to every platform build; the others fall back to per-package lookups.
+
+    Args:
+        codename: Ubuntu codename like "noble"
+
+    Returns:
+        Dict of package -> version
+    """
+    if codename not in _archive_cache:
+        jobs = [(arch, pocket) for arch in ARCHIVE_URLS for pocket in ARCHIVE_POCKETS]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            results = executor.map(
+                lambda job: _get_pocket_versions(ARCHIVE_URLS[job[0]], f"{codename}{job[1]}", job[0]),
+                jobs,
+            )
+            per_arch: dict[str, dict[str, str]] = {arch: {} for arch in ARCHIVE_URLS}
+            for (arch, _), versions in zip(jobs, results):
+                per_arch[arch].update(versions)
+
+        first, *others = per_arch.values()
+        _archive_cache[codename] = {
+            pkg: version
+            for pkg, version in first.items()
+            if all(other.get(pkg) == version for other in others)
+        }
+
+    return _archive_cache[codename]
+
+
+def get_package_versions(packages: list[str], codename: str) -> dict[str, str | None]:
+    """Resolve versions for many packages with as few requests as possible.
+
+    Cached results are used first, then the archive indices for the release,
+    and only the remaining packages are looked up one by one.
+
+    Args:
+        packages: Package names like ["curl", "git"]
+        codename: Ubuntu codename like "noble"
+
+    Returns:
+        Dict of package -> version, with None for packages not found
+    """
+    results: dict[str, str | None] = {}
+    remaining = []
+    for pkg in packages:
+        cached = _cached_lookup("packages", f"{codename}/{pkg}", PACKAGE_VERSION_TTL)
+        if cached:
+            results[pkg] = cached
+        else:
+            remaining.append(pkg)
+
+    if remaining:
+        archive = get_archive_versions(codename)
+        missing = []
+        for pkg in remaining:
+            version = archive.get(pkg)
+            if version:
+                _store_lookup("packages", f"{codename}/{pkg}", version)
+                results[pkg] = version
+            else:
+                missing.append(pkg)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(PACKAGE_LOOKUP_WORKERS, len(missing))) as executor:
+                for pkg, version in zip(missing, executor.map(lambda p: get_package_version(p, codename), missing)):
+                    results[pkg] = version
+
+    return results
+
+
+def _apt_install_packages(command: list[str]) -> list[str]:
+    """Get the packages of one shell command if it is an apt install.
+
+    Args:
+        command: Words of a single simple command
+
+    Returns:
+        Package names, empty if the command is not 'apt-get/apt install'
+    """
+    words = iter(command)
+    for word in words:
+        # Skip leading VAR=value assignments and sudo
+        if "=" not in word and word != "sudo":
+            break
+    else:
+        return []
+    if word not in _APT_COMMANDS:
+        return []
+
+    # Options may precede the subcommand, some of them take a value
+    for word in words:
+        if word in _APT_VALUE_OPTIONS:
+            next(words, None)
+        elif not word.startswith("-"):
+            break
+    else:
+        return []
+    if word != "install":
+        return []
+
+    packages = []
+    for word in words:
+        if word in _APT_VALUE_OPTIONS:
+            next(words, None)
+        elif "=" not in word and _PACKAGE_NAME_RE.fullmatch(word):
+            packages.append(word)
+    return packages
+
+
 def extract_packages_from_dockerfile(dockerfile_content: str) -> list[str]:
-    """Extract package names from apt-get install commands.
+    """Extract package names from apt-get/apt install commands.
+
+    Lines are tokenized like a shell would, so quoting, command chains
+    and options before 'install' are handled. Lines the tokenizer cannot
+    parse (e.g. unbalanced quotes) fall back to a regex match.
 
     Args:
         dockerfile_content: Content of Dockerfile
@@ -226,25 +697,49 @@ def extract_packages_from_dockerfile(dockerfile_content: str) -> list[str]:
     """
     packages = []
 
-    # Match apt-get install commands (handles multiline with backslash)
-    # First, normalize line continuations
+    # Normalize line continuations
     content = dockerfile_content.replace("\\\n", " ")
 
-    # Pattern for apt-get install
-    pattern = r"apt-get\s+install\s+(?:-[a-zA-Z]+\s+)*(.+?)(?:\s*&&|\s*$|\s*;)"
+    for line in content.splitlines():
+        if "install" not in line:
+            continue
+
+        try:
+            lexer = shlex.shlex(line, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            for match in _APT_INSTALL_RE.finditer(line):
+                packages.extend(
+                    token for token in match.group(1).split()
+                    if not token.startswith("-") and "=" not in token
+                )
+            continue
 
-    for match in re.finditer(pattern, content, re.MULTILINE | re.IGNORECASE):
-        pkg_string = match.group(1)
-        # Split on whitespace and filter out flags
-        for token in pkg_string.split():
-            token = token.strip()
-            # Skip flags, version specifiers, and empty tokens
-            if token and not token.startswith("-") and "=" not in token:
-                packages.append(token)
+        # Drop the RUN instruction and its flags (--mount=..., --network=...)
+        if tokens and tokens[0].upper() == "RUN":
+            tokens = tokens[1:]
+            while tokens and tokens[0].startswith("--"):
+                tokens = tokens[1:]
+
+        # Split into simple commands at shell operators (&&, ||, ;, |, redirects)
+        command: list[str] = []
+        for token in tokens + [";"]:
+            if token.strip(_SHELL_PUNCTUATION):
+                command.append(token)
+            else:
+                packages.extend(_apt_install_packages(command))
+                command = []
 
     return packages
 
 
+@lru_cache(maxsize=None)
+def _parsed_packages(path: str, mtime_ns: int) -> frozenset[str]:
+    """Packages installed by a Dockerfile, cached per file version."""
+    return frozenset(extract_packages_from_dockerfile(Path(path).read_text()))
+
+
 def extract_base_image(dockerfile_content: str) -> tuple[str, str] | None:
     """Extract effective base image from Dockerfile (last FROM line).
 
@@ -257,15 +752,18 @@ def extract_base_image(dockerfile_content: str) -> tuple[str, str] | None:
         Tuple of (image, tag) or None if not found.
         For digest references (image@sha256:...), returns (image, digest).
     """
-    # Match FROM line - handle both tag (:) and digest (@) formats
-    # FROM ubuntu:24.04 -> ("ubuntu", "24.04")
-    # FROM ubuntu@sha256:abc123 -> ("ubuntu", "sha256:abc123")
-    pattern = r"^FROM\s+([^\s:@]+)(?:[:@]([^\s]+))?(?:\s+AS\s+\w+)?$"
+    return _last_base_image(dockerfile_content.splitlines())
 
+
+def _last_base_image(lines: Iterable[str]) -> tuple[str, str] | None:
+    """Find the last FROM reference in Dockerfile lines, see extract_base_image."""
+    # Match FROM line - handle both tag (:) and digest (@) formats
     last_match = None
-    for line in dockerfile_content.splitlines():
+    for line in lines:
         line = line.strip()
-        match = re.match(pattern, line, re.IGNORECASE)
+        if line[:4].upper() != "FROM":
+            continue
+        match = _FROM_LINE_RE.match(line)
         if match:
             image = match.group(1)
             tag_or_digest = match.group(2) or "latest"
@@ -274,6 +772,58 @@ def extract_base_image(dockerfile_content: str) -> tuple[str, str] | None:
     return last_match
 
 
+# Parsed lock files keyed by resolved path, with the (mtime_ns, size) they were read at
+_lock_cache: dict[Path, tuple[tuple[int, int], dict]] = {}
+
+
+def _load_lock(lock_path: Path) -> dict:
+    """Parse a lock file, reusing the result while the file is unchanged.
+
+    Args:
+        lock_path: Path to packages.lock
+
+    Returns:
+        Parsed lock data, or an empty dict if the file is missing or empty
+    """
+    try:
+        stat = lock_path.stat()
+    except FileNotFoundError:
+        return {}
+
+    key = lock_path.resolve()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _lock_cache.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = _lock_cache[key] = (stamp, _load_lock_via_json(key, stamp))
+    return cached[1]
+
+
+def _load_lock_via_json(lock_path: Path, stamp: tuple[int, int]) -> dict:
+    """Parse a lock file, going through a JSON copy under dist/ when current.
+
+    JSON decodes much faster than YAML, so later processes reading the same
+    unchanged lock file skip the YAML parser. The copy is only a cache:
+    packages.lock stays the source of truth.
+    """
+    digest = hashlib.sha256(str(lock_path).encode()).hexdigest()[:16]
+    json_path = LOCK_JSON_CACHE_DIR / f"{digest}.json"
+
+    try:
+        cached = json.loads(json_path.read_bytes())
+        if cached["stamp"] == list(stamp):
+            return cached["data"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    data = _load_yaml(lock_path) or {}
+    try:
+        LOCK_JSON_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(json_path, json.dumps({"stamp": stamp, "data": data}, default=str))
+    except OSError:
+        pass
+    return data
+
+
 def read_lock_file(lock_path: Path, base_ref: str | None = None) -> dict[str, str]:
     """Read packages.lock file.
 
@@ -285,10 +835,7 @@ def read_lock_file(lock_path: Path, base_ref: str | None = None) -> dict[str, st
     Returns:
         Dict of package -> version
     """
-    if not lock_path.exists():
-        return {}
-
-    data = yaml.safe_load(lock_path.read_text())
+    data = _load_lock(lock_path)
     if not data:
         return {}
 
@@ -317,10 +864,7 @@ def read_base_digest(lock_path: Path, base_ref: str | None = None) -> tuple[str,
     Returns:
         Tuple of (original_ref, digest) or None if not available
     """
-    if not lock_path.exists():
-        return None
-
-    data = yaml.safe_load(lock_path.read_text())
+    data = _load_lock(lock_path)
     if not data:
         return None
 
@@ -356,10 +900,7 @@ def read_all_bases(lock_path: Path) -> dict[str, dict]:
     Returns:
         Dict of base_ref -> {digest, codename, packages}
     """
-    if not lock_path.exists():
-        return {}
-
-    data = yaml.safe_load(lock_path.read_text())
+    data = _load_lock(lock_path)
     if not data:
         return {}
 
@@ -388,7 +929,14 @@ def write_lock_file(
         "bases": bases,
     }
 
-    lock_path.write_text(yaml.dump(content, default_flow_style=False, sort_keys=False))
+    import yaml
+
+    try:
+        dumper = yaml.CSafeDumper
+    except AttributeError:  # PyYAML built without libyaml
+        dumper = yaml.SafeDumper
+
+    _atomic_write_text(lock_path, yaml.dump(content, Dumper=dumper, default_flow_style=False, sort_keys=False))
 
 
 def rewrite_apt_install(dockerfile_content: str, packages: dict[str, str]) -> str:
@@ -401,16 +949,15 @@ def rewrite_apt_install(dockerfile_content: str, packages: dict[str, str]) -> st
     Returns:
         Modified Dockerfile content with pinned versions
     """
-    result = dockerfile_content
+    if not packages:
+        return dockerfile_content
 
-    for package, version in packages.items():
-        # Replace package name with pinned version
-        # Match package name not already pinned (not followed by =)
-        pattern = rf"(?<![=\w-]){re.escape(package)}(?![=\w-])"
-        replacement = f"{package}={version}"
-        result = re.sub(pattern, replacement, result)
+    # Match any package name not already pinned (not followed by =) in one pass.
+    # Longest names first so a package never shadows a longer one it prefixes.
+    names = sorted(packages, key=len, reverse=True)
+    pattern = re.compile(rf"(?<![=\w-])({'|'.join(map(re.escape, names))})(?![=\w-])")
 
-    return result
+    return pattern.sub(lambda m: f"{m.group(1)}={packages[m.group(1)]}", dockerfile_content)
 
 
 def rewrite_from_digest(
@@ -438,17 +985,23 @@ def rewrite_from_digest(
     # Pattern to match FROM with optional AS clause
     # FROM ubuntu:24.04 -> FROM ubuntu@sha256:abc123
     # FROM ubuntu:24.04 AS builder -> FROM ubuntu@sha256:abc123 AS builder
-    pattern = rf"^(FROM\s+){re.escape(image)}:{re.escape(tag)}(\s+AS\s+\w+)?$"
-    replacement = rf"\g<1>{image}@{digest}\g<2>"
+    ref = f"{image}:{tag}".lower()
+    lines = []
+    for line in dockerfile_content.splitlines(keepends=True):
+        body = line.rstrip("\r\n")
+        match = _FROM_REF_RE.match(body)
+        if match and match.group(2).lower() == ref:
+            line = f"{match.group(1)}{image}@{digest}{match.group(3) or ''}{line[len(body):]}"
+        lines.append(line)
 
-    return re.sub(pattern, replacement, dockerfile_content, flags=re.MULTILINE | re.IGNORECASE)
+    return "".join(lines)
 
 
 def _get_base_ref(dockerfile_path: Path, dist_dir: Path) -> str | None:
     """Get the effective Ubuntu base reference for a Dockerfile.
 
-    Uses syft to inspect built base images and extract the actual Ubuntu version.
-    Falls back to Dockerfile parsing if image tar not available.
+    Follows the chain of generated Dockerfiles for local base images and
+    only uses syft on a built image tar when the text doesn't resolve.
 
     Args:
         dockerfile_path: Path to the Dockerfile
@@ -457,8 +1010,9 @@ def _get_base_ref(dockerfile_path: Path, dist_dir: Path) -> str | None:
     Returns:
         Normalized ref like 'ubuntu:24.04' or None if not Ubuntu-based
     """
-    content = dockerfile_path.read_text()
-    base = extract_base_image(content)  # Gets last FROM (multi-stage aware)
+    # Stream the lines instead of reading the file into one string
+    with dockerfile_path.open() as f:
+        base = _last_base_image(f)  # Gets last FROM (multi-stage aware)
     if not base:
         return None
 
@@ -479,8 +1033,15 @@ def _get_base_ref(dockerfile_path: Path, dist_dir: Path) -> str | None:
             return None
         return f"ubuntu:{tag}"
 
-    # Local image - use syft to inspect the built image tar
+    # Local image - follow the Dockerfile chain first, it is only text
     if "/" not in image and image not in ("alpine", "debian"):
+        base_dockerfile = dist_dir / image / tag / "Dockerfile"
+        if base_dockerfile.exists():
+            base_ref = _get_base_ref(base_dockerfile, dist_dir)
+            if base_ref:
+                return base_ref
+
+        # Fallback: use syft to inspect the built image tar
         image_tar = dist_dir / image / tag / "image.tar"
         if image_tar.exists():
             distro = extract_distro_from_image(image_tar)
@@ -489,11 +1050,27 @@ def _get_base_ref(dockerfile_path: Path, dist_dir: Path) -> str | None:
                 if version:
                     return f"ubuntu:{version}"
 
-        # Fallback: follow Dockerfile chain if tar not available
-        base_dockerfile = dist_dir / image / tag / "Dockerfile"
-        if base_dockerfile.exists():
-            return _get_base_ref(base_dockerfile, dist_dir)
+    return None
+
+
+def _find_image_dir(images_dir: Path, name: str) -> Path | None:
+    """Find the source directory holding an image's image.yml.
 
+    Only the depths an image can live at are globbed instead of walking the
+    whole images tree: images/<name>/<variant>/, images/<name>/<a>/<b>/ and
+    images/<group>/<name>/<variant>/.
+
+    Args:
+        images_dir: Path to images directory
+        name: Image name
+
+    Returns:
+        Directory containing image.yml, or None if not found
+    """
+    patterns = (f"{name}/*/image.yml", f"{name}/*/*/image.yml", f"*/{name}/*/image.yml")
+    for pattern in patterns:
+        for image_yml in images_dir.glob(pattern):
+            return image_yml.parent
     return None
 
 
@@ -523,27 +1100,26 @@ def run_lock(
     first_tag = image_refs[0].split(":")[1]
 
     # Determine lock file path
-    image_dir = None
-    for subdir in images_dir.rglob("image.yml"):
-        parent = subdir.parent
-        if parent.parent.name == name or (parent.parent.parent.exists() and parent.parent.parent.name == name):
-            image_dir = parent
-            break
-
-    if not image_dir:
-        image_dir = dist_dir / name / first_tag
+    image_dir = _find_image_dir(images_dir, name) or dist_dir / name / first_tag
 
     lock_path = image_dir / "packages.lock"
 
-    # Group tags by their base image
-    base_to_tags: dict[str, list[str]] = {}
+    # Determine bases concurrently - each may wait on a syft scan
+    candidates = []
     for ref in image_refs:
         tag = ref.split(":")[1]
         dockerfile_path = dist_dir / name / tag / "Dockerfile"
-        if not dockerfile_path.exists():
-            continue
+        if dockerfile_path.exists():
+            candidates.append((ref, tag, dockerfile_path))
+
+    base_refs = []
+    if candidates:
+        with ThreadPoolExecutor(max_workers=min(8, len(candidates))) as executor:
+            base_refs = list(executor.map(lambda c: _get_base_ref(c[2], dist_dir), candidates))
 
-        base_ref = _get_base_ref(dockerfile_path, dist_dir)
+    # Group tags by their base image
+    base_to_tags: dict[str, list[str]] = {}
+    for (ref, tag, _), base_ref in zip(candidates, base_refs):
         if not base_ref:
             print(f"  Warning: Could not determine base for {ref}, skipping")
             continue
@@ -563,6 +1139,17 @@ def run_lock(
     # Check for existing lock data
     existing_bases = read_all_bases(lock_path)
 
+    # Resolve digests of bases that need a new section up front, in parallel
+    unlocked = [
+        base_ref for base_ref in base_to_tags
+        if not existing_bases.get(base_ref, {}).get("packages")
+        and not existing_bases.get(base_ref, {}).get("digest")
+    ]
+    digests: dict[str, str | None] = {}
+    if unlocked:
+        with ThreadPoolExecutor(max_workers=len(unlocked)) as executor:
+            digests = dict(zip(unlocked, executor.map(resolve_image_digest, unlocked)))
+
     # Build lock sections per base
     bases_data: dict[str, dict] = {}
 
@@ -588,14 +1175,11 @@ def run_lock(
                 continue
 
         # Extract packages from all tags using this base
-        all_packages = set()
-        for tag in tags:
-            path = dist_dir / name / tag / "Dockerfile"
-            if path.exists():
-                content = path.read_text()
-                packages = extract_packages_from_dockerfile(content)
-                if packages:
-                    all_packages.update(packages)
+        all_packages = frozenset().union(*(
+            _parsed_packages(str(path), path.stat().st_mtime_ns)
+            for path in (dist_dir / name / tag / "Dockerfile" for tag in tags)
+            if path.exists()
+        ))
 
         if not all_packages:
             print(f"  No packages found for {base_ref}")
@@ -604,28 +1188,21 @@ def run_lock(
         packages = sorted(all_packages)
         print(f"  {len(packages)} unique packages")
 
-        # Resolve versions in parallel
         print("  Resolving versions...")
         locked = {}
         not_found = []
 
-        def resolve_pkg(pkg: str) -> tuple[str, str | None]:
-            return (pkg, get_package_version(pkg, codename))
-
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = {executor.submit(resolve_pkg, pkg): pkg for pkg in packages}
-            for future in as_completed(futures):
-                pkg, version = future.result()
-                if version:
-                    locked[pkg] = version
-                else:
-                    not_found.append(pkg)
+        for pkg, version in get_package_versions(packages, codename).items():
+            if version:
+                locked[pkg] = version
+            else:
+                not_found.append(pkg)
 
         if not_found:
             print(f"  Not found: {', '.join(not_found)}")
 
-        # Resolve digest
-        digest = resolve_image_digest(base_ref)
+        # Keep an already locked digest, otherwise use the one resolved above
+        digest = existing_bases.get(base_ref, {}).get("digest") or digests.get(base_ref)
         if digest:
             print(f"  Digest: {digest[:19]}...")
 
@@ -635,6 +1212,8 @@ def run_lock(
             "packages": locked,
         }
 
+    save_lookup_cache()
+
     if not bases_data:
         print("Error: Could not resolve any packages")
         return 1
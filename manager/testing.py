@@ -10,6 +10,9 @@ from pathlib import Path
 import docker
 from docker.errors import NotFound, APIError
 
+from manager.building import get_docker_client, wait_for_port
+from manager.config import get_push_registry
+
 # Docker-in-Docker container for isolated testing
 DIND_CONTAINER_NAME = "image-manager-dind"
 DIND_PORT = 2375
@@ -18,7 +21,7 @@ DIND_IMAGE = "docker:dind"
 
 def get_host_client() -> docker.DockerClient:
     """Get Docker client for the host daemon."""
-    return docker.from_env()
+    return get_docker_client()
 
 
 def get_dind_client() -> docker.DockerClient:
@@ -106,14 +109,19 @@ def start_dind() -> int:
 
     # Wait for Docker daemon inside dind to be ready
     print("Waiting for Docker daemon to be ready...")
-    for _ in range(60):  # 30 second timeout
-        try:
-            dind = get_dind_client()
-            dind.ping()
-            print(f"dind container started (addr: tcp://127.0.0.1:{DIND_PORT})")
-            return 0
-        except Exception:
-            time.sleep(0.5)
+    deadline = time.monotonic() + 30  # 30 second timeout
+    backoff = 0.05
+    while (remaining := deadline - time.monotonic()) > 0:
+        if wait_for_port(DIND_PORT, remaining):
+            try:
+                dind = get_dind_client()
+                dind.ping()
+                print(f"dind container started (addr: tcp://127.0.0.1:{DIND_PORT})")
+                return 0
+            except Exception:
+                # Port is published but the daemon inside is not serving yet
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 0.5)
 
     print("Timeout waiting for dind container", file=sys.stderr)
     return 1
@@ -268,8 +276,6 @@ def pull_image(image_ref: str, snapshot_id: str | None = None) -> bool:
     Returns:
         True if successful, False otherwise
     """
-    from manager.config import get_registry_url, get_push_registry
-
     registry = get_push_registry()
     name, tag = image_ref.split(":", 1)
 
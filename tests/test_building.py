@@ -0,0 +1,328 @@
+"""Tests for building helpers."""
+
+import socket
+import sys
+
+import pytest
+
+from manager.building import (
+    _UMASK,
+    _atomic_write,
+    _run_build_command,
+    _tool_env,
+    ensure_dockerignore,
+    get_compression_opts,
+    get_local_images,
+    get_registry_cache_args,
+    inject_cache_mounts,
+    is_port_open,
+    link_or_copy,
+    normalize_platform,
+    rewrite_dockerfile_for_registry,
+    wait_for_port,
+)
+from manager.config import clear_config_cache
+
+
+def test_link_or_copy_same_filesystem(tmp_path):
+    """Hardlinks when source and destination share a filesystem."""
+    src = tmp_path / "linux-amd64" / "image.tar"
+    src.parent.mkdir()
+    src.write_bytes(b"layer-data")
+    dst = tmp_path / "image.tar"
+
+    link_or_copy(src, dst)
+
+    assert dst.read_bytes() == b"layer-data"
+    assert dst.stat().st_ino == src.stat().st_ino
+
+
+def test_link_or_copy_falls_back_when_link_fails(tmp_path, monkeypatch):
+    """Copies content when hardlinking is not possible."""
+    src = tmp_path / "src.tar"
+    src.write_bytes(b"layer-data" * 1024)
+    dst = tmp_path / "dst.tar"
+
+    def fail_link(*args, **kwargs):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr("manager.building.os.link", fail_link)
+
+    link_or_copy(src, dst)
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_ino != src.stat().st_ino
+
+
+def test_wait_for_port_open():
+    """Returns True as soon as a listener accepts connections."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+
+        assert wait_for_port(port, timeout=1) is True
+
+
+def test_wait_for_port_times_out():
+    """Returns False when nothing listens before the deadline."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    assert wait_for_port(port, timeout=0.2) is False
+
+
+def test_rewrite_dockerfile_for_registry(tmp_path, monkeypatch):
+    """Local base images are rewritten to the registry, others untouched."""
+    monkeypatch.chdir(tmp_path)
+    clear_config_cache()
+    original = (
+        "FROM base:2025.09 AS build\n"
+        "RUN make\n"
+        "from ubuntu:24.04\n"
+    )
+
+    content, rewritten = rewrite_dockerfile_for_registry(original, {"base:2025.09"})
+
+    assert rewritten == 1
+    assert content == (
+        "FROM host.docker.internal:5050/base:2025.09 AS build\n"
+        "RUN make\n"
+        "from ubuntu:24.04\n"
+    )
+
+
+def test_rewrite_dockerfile_for_registry_unchanged(tmp_path, monkeypatch):
+    """Reports zero rewrites when no FROM references a local image."""
+    monkeypatch.chdir(tmp_path)
+    clear_config_cache()
+    original = "FROM ubuntu:24.04\nRUN apt-get update\n"
+
+    content, rewritten = rewrite_dockerfile_for_registry(original, {"base:2025.09"}, cache_mounts=False)
+
+    assert rewritten == 0
+    assert content == "FROM ubuntu:24.04\nRUN apt-get update\n"
+
+
+def test_get_local_images(tmp_path, monkeypatch):
+    """Only tag directories containing a generated Dockerfile count."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "dist" / "base" / "2025.09").mkdir(parents=True)
+    (tmp_path / "dist" / "base" / "2025.09" / "Dockerfile").write_text("FROM ubuntu:24.04\n")
+    (tmp_path / "dist" / "base" / "empty").mkdir()
+    (tmp_path / "dist" / "base" / "2025").write_text("2025.09")  # alias file
+    (tmp_path / "dist" / "index.html").write_text("")
+
+    assert get_local_images() == {"base:2025.09"}
+
+
+def test_get_local_images_without_dist(tmp_path, monkeypatch):
+    """Returns an empty set when nothing has been generated."""
+    monkeypatch.chdir(tmp_path)
+
+    assert get_local_images() == set()
+
+
+def test_is_port_open():
+    """Detects listening and closed ports."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+
+        assert is_port_open(port) is True
+
+    assert is_port_open(port) is False
+
+
+def test_atomic_write_replaces_file(tmp_path):
+    """Overwrites the target and leaves no temp files behind."""
+    target = tmp_path / "buildkitd.toml"
+    target.write_text("old")
+
+    _atomic_write(target, "new")
+
+    assert target.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["buildkitd.toml"]
+
+
+def test_normalize_platform():
+    """Short and full platform names normalize to the full form."""
+    assert normalize_platform("amd64") == "linux/amd64"
+    assert normalize_platform("linux/arm64") == "linux/arm64"
+
+
+def test_normalize_platform_unknown():
+    """Unknown platforms raise with the supported list."""
+    with pytest.raises(ValueError, match="Supported"):
+        normalize_platform("riscv64")
+
+
+def test_run_build_command_prefixes_output(capsys):
+    """Prefixed output tags every line and keeps the exit code."""
+    cmd = [sys.executable, "-c", "import sys; print('one'); print('two', file=sys.stderr); sys.exit(3)"]
+
+    assert _run_build_command(cmd, "linux/arm64") == 3
+
+    lines = capsys.readouterr().err.splitlines()
+    assert sorted(lines) == ["[linux/arm64] one", "[linux/arm64] two"]
+
+
+def test_get_registry_cache_args(monkeypatch):
+    """Exports to the branch ref and imports branch, main and latest."""
+    monkeypatch.setattr("manager.building.is_registry_insecure", lambda: False)
+    monkeypatch.setenv("GITHUB_REF_NAME", "feature/foo")
+    monkeypatch.delenv("CI_COMMIT_REF_SLUG", raising=False)
+    monkeypatch.setenv("DOCKER_CACHE_REPO", "registry.example.com/cache")
+
+    assert get_registry_cache_args("base", "linux-amd64") == [
+        "--export-cache", "type=registry,ref=registry.example.com/cache:linux-amd64-feature-foo,mode=max,oci-mediatypes=true",
+        "--import-cache", "type=registry,ref=registry.example.com/cache:linux-amd64-feature-foo",
+        "--import-cache", "type=registry,ref=registry.example.com/cache:linux-amd64-main",
+        "--import-cache", "type=registry,ref=registry.example.com/cache:linux-amd64-latest",
+    ]
+
+
+def test_get_registry_cache_args_outside_ci(monkeypatch):
+    """Without a branch, cache goes to the latest ref."""
+    monkeypatch.setattr("manager.building.is_registry_insecure", lambda: False)
+    monkeypatch.delenv("GITHUB_REF_NAME", raising=False)
+    monkeypatch.delenv("CI_COMMIT_REF_SLUG", raising=False)
+    monkeypatch.setenv("DOCKER_CACHE_REPO", "registry.example.com/cache")
+
+    args = get_registry_cache_args("base", "linux-arm64")
+
+    assert args[1] == "type=registry,ref=registry.example.com/cache:linux-arm64-latest,mode=max,oci-mediatypes=true"
+    assert args.count("--import-cache") == 2
+
+
+def test_get_registry_cache_args_insecure_registry(monkeypatch):
+    """Insecure registries are marked on every cache ref."""
+    monkeypatch.setattr("manager.building.is_registry_insecure", lambda: True)
+    monkeypatch.delenv("GITHUB_REF_NAME", raising=False)
+    monkeypatch.delenv("CI_COMMIT_REF_SLUG", raising=False)
+    monkeypatch.setenv("DOCKER_CACHE_REPO", "localhost:5050/cache")
+
+    args = get_registry_cache_args("base", "linux-amd64")
+
+    assert args[1] == "type=registry,ref=localhost:5050/cache:linux-amd64-latest,mode=max,oci-mediatypes=true,registry.insecure=true"
+    assert args[3] == "type=registry,ref=localhost:5050/cache:linux-amd64-main,registry.insecure=true"
+
+
+def test_inject_cache_mounts_apt():
+    """apt RUN instructions get cache mounts and lose list cleanup."""
+    content = (
+        "FROM ubuntu:24.04\n"
+        "RUN apt-get update \\\n"
+        "    && apt-get install -y curl \\\n"
+        "    && rm -rf /var/lib/apt/lists/*\n"
+        "RUN make\n"
+    )
+
+    new_content, rewritten = inject_cache_mounts(content)
+
+    assert rewritten == 1
+    assert new_content == (
+        "FROM ubuntu:24.04\n"
+        "RUN --mount=type=cache,target=/var/cache/apt,sharing=locked "
+        "--mount=type=cache,target=/var/lib/apt/lists,sharing=locked "
+        "{ mv /etc/apt/apt.conf.d/docker-clean /etc/apt/docker-clean.off 2>/dev/null || true; } && "
+        "apt-get update \\\n"
+        "    && apt-get -o APT::Keep-Downloaded-Packages=true install -y curl"
+        " && { mv /etc/apt/docker-clean.off /etc/apt/apt.conf.d/docker-clean 2>/dev/null || true; }\n"
+        "RUN make\n"
+    )
+
+
+def test_inject_cache_mounts_keeps_existing_mounts():
+    """Instructions that already mount a cache are untouched."""
+    content = "FROM node:22\nRUN --mount=type=cache,target=/root/.npm npm ci\n"
+
+    assert inject_cache_mounts(content) == (content, 0)
+
+
+def test_get_compression_opts(monkeypatch):
+    """Compression settings map to buildctl exporter options."""
+    monkeypatch.delenv("IMAGE_MANAGER_COMPRESSION", raising=False)
+    monkeypatch.delenv("IMAGE_MANAGER_COMPRESSION_LEVEL", raising=False)
+    assert get_compression_opts() == ""
+
+    monkeypatch.setenv("IMAGE_MANAGER_COMPRESSION", "zstd")
+    monkeypatch.setenv("IMAGE_MANAGER_COMPRESSION_LEVEL", "3")
+    assert get_compression_opts() == ",compression=zstd,oci-mediatypes=true,compression-level=3"
+
+
+def test_ensure_dockerignore(tmp_path):
+    """Excludes previous build outputs from a context without .dockerignore."""
+    (tmp_path / "Dockerfile").write_text("FROM ubuntu:24.04\n")
+    (tmp_path / "image.tar").write_bytes(b"x" * 100)
+    (tmp_path / "linux-amd64").mkdir()
+    (tmp_path / "linux-amd64" / "image.tar").write_bytes(b"x" * 50)
+
+    assert ensure_dockerignore(tmp_path) == 150
+    assert "image.tar" in (tmp_path / ".dockerignore").read_text().splitlines()
+
+
+def test_ensure_dockerignore_keeps_existing(tmp_path):
+    """An existing .dockerignore is left untouched."""
+    (tmp_path / ".dockerignore").write_text("secrets/\n")
+
+    assert ensure_dockerignore(tmp_path) == 0
+    assert (tmp_path / ".dockerignore").read_text() == "secrets/\n"
+
+
+def test_link_or_copy_replaces_linked_destination(tmp_path):
+    """Replacing a hardlinked destination leaves the old source intact."""
+    old_src = tmp_path / "linux-amd64.tar"
+    old_src.write_bytes(b"amd64")
+    new_src = tmp_path / "linux-arm64.tar"
+    new_src.write_bytes(b"arm64")
+    dst = tmp_path / "image.tar"
+    link_or_copy(old_src, dst)
+
+    link_or_copy(new_src, dst)
+
+    assert dst.read_bytes() == b"arm64"
+    assert old_src.read_bytes() == b"amd64"
+
+
+def test_atomic_write_uses_umask_permissions(tmp_path):
+    """Test atomic writes are not left with mkstemp's 0600 mode"""
+    target = tmp_path / "buildkitd.toml"
+
+    _atomic_write(target, "data")
+
+    assert target.stat().st_mode & 0o777 == 0o666 & ~_UMASK
+
+
+def test_run_build_rejects_empty_platforms(monkeypatch, capsys):
+    """Test an empty platform list fails cleanly instead of raising"""
+    import manager.building as building
+
+    monkeypatch.setattr(building, "check_registry_connection", lambda: True)
+    monkeypatch.setattr(building, "login_to_all_registries", lambda: None)
+
+    assert building.run_build("app:1.0", platforms=[]) == 1
+    assert "No platforms" in capsys.readouterr().err
+
+
+def test_rewrite_dockerfile_cache_mounts_opt_in():
+    """Cache mounts are only injected when enabled for the image."""
+    content = "FROM ubuntu:24.04\nRUN apt-get update && apt-get install -y curl\n"
+
+    assert rewrite_dockerfile_for_registry(content, set()) == (content, 0)
+    assert rewrite_dockerfile_for_registry(content, set(), cache_mounts=True)[1] == 1
+
+
+def test_tool_env_reads_current_environment(monkeypatch):
+    """Tool env follows os.environ and keeps credential helper and cache variables."""
+    monkeypatch.setenv("AWS_PROFILE", "ci")
+    monkeypatch.setenv("ACTIONS_CACHE_SERVICE_V2", "true")
+    monkeypatch.setenv("IMAGE_MANAGER_TEST_NOISE", "1")
+
+    env = _tool_env()
+
+    assert env["AWS_PROFILE"] == "ci"
+    assert env["ACTIONS_CACHE_SERVICE_V2"] == "true"
+    assert "IMAGE_MANAGER_TEST_NOISE" not in env
@@ -1,7 +1,7 @@
 # tests/test_ci_generator.py
 import pytest
 from pathlib import Path
-from manager.ci_generator import build_ci_context, build_extended_context, generate_custom_ci
+from manager.ci_generator import _calculate_depths, build_ci_context, build_extended_context, generate_custom_ci
 from manager.models import Image, Tag, Variant
 from manager.config import clear_config_cache
 
@@ -371,3 +371,53 @@ def test_generate_custom_ci_missing_main_template(tmp_path):
 
     with pytest.raises(FileNotFoundError, match="Main template 'pipeline.yml.j2' not found"):
         generate_custom_ci([image], template_dir, tmp_path / "output.yml")
+
+
+def test_generate_custom_ci_template_error_keeps_old_file(tmp_path):
+    """A template failing mid-render leaves the previous output intact."""
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    (template_dir / "pipeline.yml.j2").write_text("stages:\n{{ 1 / 0 }}\n")
+
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    tpl = src_dir / "Dockerfile.jinja2"
+    tpl.write_text("FROM ubuntu:22.04")
+
+    image = Image(
+        name="test",
+        path=src_dir,
+        template_path=tpl,
+        tags=[Tag(name="latest", versions={}, variables={})],
+        variants=[],
+        extends=None,
+        versions={},
+        variables={},
+        is_base_image=False,
+        aliases={},
+    )
+    output_path = tmp_path / "output.yml"
+    output_path.write_text("previous pipeline\n")
+
+    with pytest.raises(ZeroDivisionError):
+        generate_custom_ci([image], template_dir, output_path)
+
+    assert output_path.read_text() == "previous pipeline\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["output.yml", "src", "templates"]
+
+
+def test_calculate_depths():
+    """Depth is the longest dependency chain; external deps are ignored."""
+    depths = _calculate_depths(
+        {"base", "python", "app", "tool"},
+        {"python": {"base"}, "app": {"base", "python"}, "tool": {"ubuntu"}},
+    )
+
+    assert depths == {"base": 0, "tool": 0, "python": 1, "app": 2}
+
+
+def test_calculate_depths_cycle():
+    """Images in a cycle are placed after all resolvable images."""
+    depths = _calculate_depths({"a", "b", "c"}, {"a": {"b"}, "b": {"a"}})
+
+    assert depths == {"c": 0, "a": 1, "b": 1}
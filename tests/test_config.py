@@ -3,7 +3,7 @@ import tempfile
 from pathlib import Path
 from unittest.mock import patch
 import pytest
-from manager.config import ImageConfig, TagConfig, VariantConfig, ConfigLoader, expand_env_vars, load_config, get_registry_url, get_registry_auth, clear_config_cache
+from manager.config import ImageConfig, TagConfig, VariantConfig, ConfigLoader, expand_env_vars, load_config, get_registry_url, get_registry_auth, get_registries, get_registry_auth_for, clear_config_cache
 
 
 class TestExpandEnvVars:
@@ -30,6 +30,16 @@ class TestExpandEnvVars:
         """None input returns None."""
         assert expand_env_vars(None) is None
 
+    def test_mixed_content(self):
+        """Multiple env vars embedded in literal text are expanded."""
+        with patch.dict(os.environ, {"HOST": "example.com", "PORT": "5000"}):
+            assert expand_env_vars("https://${HOST}:${PORT}/v2") == "https://example.com:5000/v2"
+
+    def test_unterminated_and_empty_references(self):
+        """Incomplete or empty references are kept literally."""
+        assert expand_env_vars("prefix-${UNTERMINATED") == "prefix-${UNTERMINATED"
+        assert expand_env_vars("a${}b") == "a${}b"
+
 
 def test_load_minimal_config(tmp_path):
     """Test loading a minimal valid config"""
@@ -46,6 +56,60 @@ tags:
     assert config.tags[0].name == "1.0"
 
 
+def test_load_is_cached_until_file_changes(tmp_path):
+    """Unchanged image.yml files are parsed once."""
+    config_file = tmp_path / "image.yml"
+    config_file.write_text("name: first\ntags:\n  - name: \"1.0\"\n")
+
+    first = ConfigLoader.load(config_file)
+    assert ConfigLoader.load(config_file) is first
+
+    config_file.write_text("name: second\ntags:\n  - name: \"1.0\"\n")
+    os.utime(config_file, ns=(0, 0))
+
+    assert ConfigLoader.load(config_file).name == "second"
+
+
+def test_load_uses_yaml_1_2_scalars(tmp_path):
+    """Unquoted values keep their YAML 1.2 meaning, as with pydantic-yaml."""
+    config_file = tmp_path / "image.yml"
+    config_file.write_text("""
+name: test-image
+rootfs_copy: false
+variables:
+  INSTALL_DOCS: no
+  PROXY: off
+  TIMEOUT: 1:30
+tags:
+  - name: yes
+""")
+
+    config = ConfigLoader.load(config_file)
+    assert config.rootfs_copy is False
+    assert config.variables == {"INSTALL_DOCS": "no", "PROXY": "off", "TIMEOUT": "1:30"}
+    assert config.tags[0].name == "yes"
+
+
+@pytest.mark.parametrize("value", [
+    "yes", "no", "on", "off", "y", "True", "false", "~", "null",
+    "1:30", "1_000", "0755", "0o17", "0x1F", "0b101", "-5", "+5",
+    "1.5", "3.10", "2025.09", "1e3", "-.5", ".inf", "24.04", "9.0.300", "2025-01-01",
+])
+def test_yaml_scalars_match_ruamel(tmp_path, value):
+    """Scalars resolve like ruamel.yaml's YAML 1.2 safe loader."""
+    ruamel = pytest.importorskip("ruamel.yaml")
+    from manager.config import _load_yaml
+
+    doc = f"key: {value}\n"
+    path = tmp_path / "doc.yml"
+    path.write_text(doc)
+
+    expected = ruamel.YAML(typ="safe", pure=True).load(doc)["key"]
+    actual = _load_yaml(path)["key"]
+    assert actual == expected
+    assert type(actual) is type(expected)
+
+
 def test_load_config_with_variants(tmp_path):
     """Test loading config with variants"""
     config_file = tmp_path / "image.yml"
@@ -306,3 +370,57 @@ class TestGetRegistryAuth:
         monkeypatch.delenv("MISSING_PASS", raising=False)
 
         assert get_registry_auth() is None
+
+
+class TestGetRegistries:
+    def setup_method(self):
+        """Clear cache before each test."""
+        clear_config_cache()
+
+    def test_cached_until_config_cleared(self, tmp_path, monkeypatch):
+        """Registries are built once per loaded config."""
+        config_file = tmp_path / ".image-manager.yml"
+        config_file.write_text("registries:\n  - url: first.com\n    default: true\n")
+        monkeypatch.chdir(tmp_path)
+
+        first = get_registries()
+        assert get_registries() is first
+
+        config_file.write_text("registries:\n  - url: second.com\n    default: true\n")
+        clear_config_cache()
+
+        assert [reg.url for reg in get_registries()] == ["second.com"]
+
+    def test_recomputed_when_referenced_env_changes(self, tmp_path, monkeypatch):
+        """Env-expanded credentials follow changes to the referenced env vars."""
+        (tmp_path / ".image-manager.yml").write_text(
+            "registries:\n"
+            "  - url: ghcr.io\n"
+            "    username: ${REG_USER}\n"
+            "    password: ${REG_PASS}\n"
+        )
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("REG_USER", "first")
+        monkeypatch.setenv("REG_PASS", "secret")
+
+        first = get_registries()
+        assert first[0].username == "first"
+        assert get_registries() is first
+
+        monkeypatch.setenv("REG_USER", "second")
+
+        assert get_registries()[0].username == "second"
+
+    def test_auth_for_image_reference(self, tmp_path, monkeypatch):
+        """Credentials match by registry prefix or by the reference host."""
+        (tmp_path / ".image-manager.yml").write_text(
+            "registries:\n"
+            "  - url: ghcr.io/myorg\n"
+            "    username: user\n"
+            "    password: secret\n"
+        )
+        monkeypatch.chdir(tmp_path)
+
+        assert get_registry_auth_for("ghcr.io/myorg/base:1.0") == ("user", "secret")
+        assert get_registry_auth_for("ghcr.io") == ("user", "secret")
+        assert get_registry_auth_for("docker.io/library/ubuntu") is None
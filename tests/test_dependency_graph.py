@@ -3,6 +3,7 @@ from pathlib import Path
 from manager.dependency_graph import (
     extract_base_image_refs,
     extract_dependencies,
+    get_template_refs,
     topological_sort,
     sort_images,
     CyclicDependencyError
@@ -48,6 +49,23 @@ def test_extract_with_single_quotes():
     assert refs == {"base"}
 
 
+def test_get_template_refs_large_template(tmp_path):
+    """Test that large templates scanned via mmap find all references"""
+    template = tmp_path / "Dockerfile.jinja2"
+    template.write_text(
+        'FROM {{ "base" | resolve_base_image }}\n'
+        + "# padding\n" * 10000
+        + "COPY --from={{ 'python' | resolve_base_image }} / /\n"
+    )
+
+    assert get_template_refs(template) == {"base", "python"}
+
+
+def test_get_template_refs_missing_template(tmp_path):
+    """Test that a missing template has no references"""
+    assert get_template_refs(tmp_path / "missing.jinja2") == frozenset()
+
+
 def test_extract_dependencies_single_image(tmp_path):
     """Test extracting dependencies from a single image with one dependency"""
     # Create template file
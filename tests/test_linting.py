@@ -0,0 +1,105 @@
+"""Tests for Dockerfile linting."""
+
+import subprocess
+import sys
+
+from manager.linting import _run_on_pty, run_lint_each, run_lint_many
+
+
+def _write_dockerfile(root, name, tag):
+    path = root / "dist" / name / tag / "Dockerfile"
+    path.parent.mkdir(parents=True)
+    path.write_text("FROM ubuntu:24.04\n")
+    return path
+
+
+def test_run_lint_many_single_invocation(tmp_path, monkeypatch):
+    """All Dockerfiles are passed to one hadolint process."""
+    monkeypatch.chdir(tmp_path)
+    _write_dockerfile(tmp_path, "base", "2025.09")
+    _write_dockerfile(tmp_path, "python", "3.13")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr("manager.linting.get_hadolint_path", lambda: "hadolint")
+    monkeypatch.setattr("manager.linting.subprocess.run", fake_run)
+
+    assert run_lint_many(["base:2025.09", "python:3.13"], strict=True) == 0
+    assert calls == [[
+        "hadolint", "--failure-threshold", "warning",
+        "dist/base/2025.09/Dockerfile", "dist/python/3.13/Dockerfile",
+    ]]
+
+
+def test_run_lint_many_missing_dockerfile(tmp_path, monkeypatch):
+    """A missing Dockerfile fails the run but the rest is still linted."""
+    monkeypatch.chdir(tmp_path)
+    _write_dockerfile(tmp_path, "base", "2025.09")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr("manager.linting.get_hadolint_path", lambda: "hadolint")
+    monkeypatch.setattr("manager.linting.subprocess.run", fake_run)
+
+    assert run_lint_many(["base:2025.09", "missing:1.0"]) == 1
+    assert calls == [["hadolint", "dist/base/2025.09/Dockerfile"]]
+
+
+def test_run_lint_each_reports_failures_in_order(tmp_path, monkeypatch, capsys):
+    """Each image is linted separately and output keeps the input order."""
+    monkeypatch.chdir(tmp_path)
+    _write_dockerfile(tmp_path, "base", "2025.09")
+    _write_dockerfile(tmp_path, "python", "3.13")
+
+    def fake_run(cmd, **kwargs):
+        returncode = 1 if "python" in cmd[-1] else 0
+        return subprocess.CompletedProcess(cmd, returncode, stdout=f"{cmd[-1]} checked\n")
+
+    monkeypatch.setattr("manager.linting.get_hadolint_path", lambda: "hadolint")
+    monkeypatch.setattr("manager.linting.subprocess.run", fake_run)
+
+    assert run_lint_each(["base:2025.09", "python:3.13", "missing:1.0"]) == ["python:3.13", "missing:1.0"]
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == [
+        "Linting base:2025.09...",
+        "dist/base/2025.09/Dockerfile checked",
+        "  No issues found",
+        "Linting python:3.13...",
+        "dist/python/3.13/Dockerfile checked",
+        "Linting missing:1.0...",
+    ]
+    assert captured.err.splitlines() == [
+        "Error: Dockerfile not found: dist/missing/1.0/Dockerfile",
+        "Run 'image-manager generate' first.",
+    ]
+
+
+def test_run_lint_each_streams_single_image(tmp_path, monkeypatch, capsys):
+    """A single image is linted without capturing hadolint's output."""
+    monkeypatch.chdir(tmp_path)
+    _write_dockerfile(tmp_path, "base", "2025.09")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(kwargs)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr("manager.linting.get_hadolint_path", lambda: "hadolint")
+    monkeypatch.setattr("manager.linting.subprocess.run", fake_run)
+
+    assert run_lint_each(["base:2025.09"]) == []
+    assert calls == [{}]
+    assert capsys.readouterr().out.splitlines() == ["Linting base:2025.09...", "  No issues found"]
+
+
+def test_run_on_pty_keeps_terminal_output():
+    """Captured output comes from a terminal, so tools keep their colors."""
+    cmd = [sys.executable, "-c", "import sys; print('tty' if sys.stdout.isatty() else 'pipe'); sys.exit(3)"]
+
+    assert _run_on_pty(cmd) == (3, "tty\n")
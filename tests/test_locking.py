@@ -0,0 +1,423 @@
+"""Tests for package locking helpers."""
+
+import gzip
+import hashlib
+import http.client
+import urllib.error
+
+import pytest
+
+from manager import locking
+
+
+@pytest.fixture(autouse=True)
+def lock_json_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(locking, "LOCK_JSON_CACHE_DIR", tmp_path / "lock-json")
+
+
+class FakeResponse:
+    def __init__(self, status=200, body=b"ok"):
+        self.status = status
+        self.reason = "OK" if status == 200 else "Not Found"
+        self.headers = {}
+        self._body = body
+
+    def read(self):
+        return self._body
+
+
+class FakeConnection:
+    instances = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.requests = []
+        self.fail_next = False
+        self.status = 200
+        FakeConnection.instances.append(self)
+
+    def request(self, method, path, headers=None):
+        if self.fail_next:
+            self.fail_next = False
+            raise http.client.RemoteDisconnected("closed")
+        self.requests.append(path)
+
+    def getresponse(self):
+        return FakeResponse(self.status, f"body:{self.requests[-1]}".encode())
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_http(monkeypatch):
+    FakeConnection.instances = []
+    monkeypatch.setattr(locking.http.client, "HTTPSConnection", FakeConnection)
+    monkeypatch.setattr(locking, "_http_local", locking.threading.local())
+    return FakeConnection
+
+
+def test_http_get_reuses_connection(fake_http):
+    """Requests to the same host share one keep-alive connection."""
+    assert locking._http_get("https://packages.ubuntu.com/noble/curl") == b"body:/noble/curl"
+    assert locking._http_get("https://packages.ubuntu.com/noble/git?x=1") == b"body:/noble/git?x=1"
+
+    assert len(fake_http.instances) == 1
+    assert fake_http.instances[0].requests == ["/noble/curl", "/noble/git?x=1"]
+
+
+def test_http_get_reconnects_once(fake_http):
+    """A connection closed by the server is replaced transparently."""
+    locking._http_get("https://packages.ubuntu.com/noble/curl")
+    fake_http.instances[0].fail_next = True
+
+    assert locking._http_get("https://packages.ubuntu.com/noble/git") == b"body:/noble/git"
+    assert len(fake_http.instances) == 2
+
+
+def test_http_get_raises_on_error_status(fake_http):
+    """Non-200 responses raise HTTPError."""
+    locking._http_get("https://packages.ubuntu.com/noble/curl")
+    fake_http.instances[0].status = 404
+
+    with pytest.raises(urllib.error.HTTPError):
+        locking._http_get("https://packages.ubuntu.com/noble/missing")
+
+
+@pytest.fixture
+def lookup_cache(tmp_path, monkeypatch):
+    path = tmp_path / "lock-cache.json"
+    monkeypatch.setattr(locking, "LOOKUP_CACHE_PATH", path)
+    monkeypatch.setattr(locking, "_lookup_cache", None)
+    monkeypatch.setattr(locking, "_lookup_cache_dirty", False)
+    return path
+
+
+def test_package_version_cached_across_runs(lookup_cache, monkeypatch):
+    """Resolved versions are persisted and served without HTTP."""
+    fetched = []
+
+    def fake_get(url):
+        fetched.append(url)
+        return b"<title>Package: curl (8.5.0-2ubuntu10.6 and others)</title>"
+
+    monkeypatch.setattr(locking, "_http_get", fake_get)
+
+    assert locking.get_package_version("curl", "noble") == "8.5.0-2ubuntu10.6"
+    locking.save_lookup_cache()
+
+    monkeypatch.setattr(locking, "_lookup_cache", None)
+    assert locking.get_package_version("curl", "noble") == "8.5.0-2ubuntu10.6"
+    assert len(fetched) == 1
+
+
+def test_package_version_cache_expires(lookup_cache, monkeypatch):
+    """Entries older than the TTL are looked up again."""
+    lookup_cache.write_text('{"packages": {"noble/curl": ["1.0", 0]}}')
+    monkeypatch.setattr(locking, "_http_get", lambda url: b"Package: curl (2.0)")
+
+    assert locking.get_package_version("curl", "noble") == "2.0"
+
+
+def test_parse_packages_index():
+    """Package stanzas map to their version."""
+    index = (
+        b"Package: curl\nArchitecture: amd64\nVersion: 8.5.0-2ubuntu10.6\n\n"
+        b"Package: git\nSource: git (1:2.43.0-1ubuntu7)\nVersion: 1:2.43.0-1ubuntu7.2\n"
+    )
+
+    assert locking.parse_packages_index(index) == {
+        "curl": "8.5.0-2ubuntu10.6",
+        "git": "1:2.43.0-1ubuntu7.2",
+    }
+
+
+def test_get_archive_versions_checks_hashes_and_architectures(monkeypatch):
+    """Indices must match their Release hash; pins must agree across architectures."""
+    indices = {
+        "amd64": gzip.compress(b"Package: curl\nVersion: 8.5.0\n\nPackage: git\nVersion: 2.43.0\n"),
+        "arm64": gzip.compress(b"Package: curl\nVersion: 8.5.0\n\nPackage: git\nVersion: 2.42.0\n"),
+    }
+
+    def fake_get(url, timeout=30):
+        arch = "arm64" if "ports" in url else "amd64"
+        if url.endswith("/noble/Release"):
+            digest = hashlib.sha256(indices[arch]).hexdigest()
+            return f"Origin: Ubuntu\nSHA256:\n {digest} 42 main/binary-{arch}/Packages.gz\n".encode()
+        if url.endswith("/noble/main/binary-amd64/Packages.gz") or url.endswith("/noble/main/binary-arm64/Packages.gz"):
+            return indices[arch]
+        if url.endswith("/Release"):
+            # Pockets whose index doesn't match its Release hash are skipped
+            return b"SHA256:\n 0000 42 main/binary-amd64/Packages.gz\n 0000 42 main/binary-arm64/Packages.gz\n"
+        return gzip.compress(b"Package: curl\nVersion: 9.9.9\n")
+
+    monkeypatch.setattr(locking, "_http_get", fake_get)
+    monkeypatch.setattr(locking, "_archive_cache", {})
+
+    assert locking.get_archive_versions("noble") == {"curl": "8.5.0"}
+
+
+def test_get_package_versions_prefers_archive(lookup_cache, monkeypatch):
+    """Archive indices resolve most packages; the rest fall back per package."""
+    monkeypatch.setattr(locking, "get_archive_versions", lambda codename: {"curl": "8.5.0"})
+    looked_up = []
+
+    def fake_version(package, codename):
+        looked_up.append(package)
+        return "1.0" if package == "jq" else None
+
+    monkeypatch.setattr(locking, "get_package_version", fake_version)
+
+    assert locking.get_package_versions(["curl", "jq", "nope"], "noble") == {
+        "curl": "8.5.0",
+        "jq": "1.0",
+        "nope": None,
+    }
+    assert sorted(looked_up) == ["jq", "nope"]
+
+
+def test_extract_packages_from_dockerfile():
+    """Packages are collected across continued apt-get install lines."""
+    content = (
+        "FROM ubuntu:24.04\n"
+        "RUN apt-get update && apt-get install -y --no-install-recommends \\\n"
+        "    curl git=1:2.43.0 ca-certificates \\\n"
+        "    && rm -rf /var/lib/apt/lists/*\n"
+    )
+
+    assert locking.extract_packages_from_dockerfile(content) == ["curl", "ca-certificates"]
+
+
+def test_extract_base_image_uses_last_from():
+    """The final stage determines the base; digests are kept as the tag."""
+    content = "FROM golang:1.23 AS build\nRUN make\nFROM ubuntu@sha256:abc123\n"
+
+    assert locking.extract_base_image(content) == ("ubuntu", "sha256:abc123")
+
+
+def test_rewrite_apt_install_pins_in_one_pass():
+    """Unpinned packages get versions; pinned and partial names are untouched."""
+    content = "RUN apt-get install -y curl libcurl4 git=1:2.43.0 python3-venv python3\n"
+    packages = {"curl": "8.5.0", "libcurl4": "8.5.0", "git": "1:2.44.0", "python3": "3.12.3"}
+
+    assert locking.rewrite_apt_install(content, packages) == (
+        "RUN apt-get install -y curl=8.5.0 libcurl4=8.5.0 git=1:2.43.0 python3-venv python3=3.12.3\n"
+    )
+    assert locking.rewrite_apt_install(content, {}) == content
+
+
+def test_lock_file_parsed_once_until_changed(tmp_path, monkeypatch):
+    """Readers share one parse per lock file version."""
+    lock_path = tmp_path / "packages.lock"
+    lock_path.write_text(
+        "bases:\n"
+        "  ubuntu:24.04:\n"
+        "    digest: sha256:abc\n"
+        "    packages:\n"
+        "      curl: 8.5.0\n"
+    )
+    parses = []
+    original = locking._load_yaml
+    monkeypatch.setattr(locking, "_load_yaml", lambda path: parses.append(path) or original(path))
+
+    assert locking.read_lock_file(lock_path, "ubuntu:24.04") == {"curl": "8.5.0"}
+    assert locking.read_base_digest(lock_path, "ubuntu:24.04") == ("ubuntu:24.04", "sha256:abc")
+    assert list(locking.read_all_bases(lock_path)) == ["ubuntu:24.04"]
+    assert len(parses) == 1
+
+    lock_path.write_text("packages:\n  git: 2.43.0\n")
+    assert locking.read_lock_file(lock_path) == {"git": "2.43.0"}
+    assert len(parses) == 2
+
+
+def test_read_lock_file_missing(tmp_path):
+    """A missing lock file reads as empty."""
+    assert locking.read_lock_file(tmp_path / "packages.lock") == {}
+    assert locking.read_base_digest(tmp_path / "packages.lock") is None
+
+
+def test_docker_hub_digest(monkeypatch):
+    """Official images resolve through an anonymous token and a HEAD request."""
+    requests = []
+
+    def fake_request(url, method="GET", headers=None, timeout=30):
+        requests.append((method, url, headers))
+        if url.startswith(locking.DOCKER_HUB_AUTH_URL):
+            return {}, b'{"token": "t0k"}'
+        return {"Docker-Content-Digest": "sha256:abc"}, b""
+
+    monkeypatch.setattr(locking, "_http_request", fake_request)
+
+    assert locking._docker_hub_digest("ubuntu:24.04") == "sha256:abc"
+    assert requests[0][1].endswith("scope=repository:library/ubuntu:pull")
+    assert requests[1][:2] == ("HEAD", "https://registry-1.docker.io/v2/library/ubuntu/manifests/24.04")
+    assert requests[1][2]["Authorization"] == "Bearer t0k"
+
+
+def test_docker_hub_digest_skips_other_registries():
+    """References to other registries are left to crane."""
+    assert locking._docker_hub_digest("ghcr.io/org/image:1.0") is None
+    assert locking._docker_hub_digest("localhost:5050/base:2025.09") is None
+    assert locking._docker_hub_digest("ubuntu@sha256:abc") is None
+
+
+def test_run_lock_groups_tags_by_base(tmp_path, monkeypatch):
+    """Tags sharing a base end up in one lock section."""
+    monkeypatch.chdir(tmp_path)
+    dist_dir = tmp_path / "dist"
+    for tag, package in (("1.0", "curl"), ("1.1", "git"), ("2.0", "jq")):
+        dockerfile = dist_dir / "tool" / tag / "Dockerfile"
+        dockerfile.parent.mkdir(parents=True)
+        base = "ubuntu:22.04" if tag == "2.0" else "ubuntu:24.04"
+        dockerfile.write_text(f"FROM {base}\nRUN apt-get install -y {package}\n")
+
+    monkeypatch.setattr(locking, "login_to_registries", lambda: None)
+    monkeypatch.setattr(locking, "get_ubuntu_codename", {"24.04": "noble", "22.04": "jammy"}.get)
+    monkeypatch.setattr(locking, "get_package_versions", lambda pkgs, codename: {p: f"{codename}-1" for p in pkgs})
+    monkeypatch.setattr(locking, "resolve_image_digest", lambda ref: f"sha256:{ref}")
+
+    refs = ["tool:1.0", "tool:1.1", "tool:2.0"]
+    assert locking.run_lock(refs, tmp_path / "images", dist_dir) == 0
+
+    bases = locking.read_all_bases(dist_dir / "tool" / "1.0" / "packages.lock")
+    assert bases["ubuntu:24.04"]["packages"] == {"curl": "noble-1", "git": "noble-1"}
+    assert bases["ubuntu:22.04"]["packages"] == {"jq": "jammy-1"}
+
+
+def test_extract_distro_scans_each_tar_once(lookup_cache, tmp_path, monkeypatch):
+    """An unchanged tar is scanned by syft only once."""
+    syft = tmp_path / "syft"
+    syft.write_text("")
+    image_tar = tmp_path / "image.tar"
+    image_tar.write_bytes(b"tar")
+    scans = []
+
+    def fake_scan(syft_path, tar):
+        scans.append(tar)
+        return {"id": "ubuntu", "versionID": "24.04", "versionCodename": "noble", "name": "Ubuntu"}
+
+    monkeypatch.setattr(locking, "get_syft_path", lambda: syft)
+    monkeypatch.setattr(locking, "_scan_distro", fake_scan)
+
+    first = locking.extract_distro_from_image(image_tar)
+    assert locking.extract_distro_from_image(image_tar) == first
+    assert len(scans) == 1
+
+    image_tar.write_bytes(b"rebuilt tar")
+    locking.extract_distro_from_image(image_tar)
+    assert len(scans) == 2
+
+
+def test_get_base_ref_follows_dockerfile_chain_before_syft(tmp_path, monkeypatch):
+    """Local bases resolve from their Dockerfile without scanning the tar."""
+    base = tmp_path / "base" / "2025.09"
+    base.mkdir(parents=True)
+    (base / "Dockerfile").write_text("FROM ubuntu:24.04\n")
+    (base / "image.tar").write_bytes(b"tar")
+    child = tmp_path / "python" / "3.13"
+    child.mkdir(parents=True)
+    (child / "Dockerfile").write_text("FROM base:2025.09\n")
+
+    def fail_scan(image_tar):
+        raise AssertionError("syft should not run")
+
+    monkeypatch.setattr(locking, "extract_distro_from_image", fail_scan)
+
+    assert locking._get_base_ref(child / "Dockerfile", tmp_path) == "ubuntu:24.04"
+
+
+def test_extract_packages_shell_aware():
+    """Options, env prefixes, apt and command chains are understood."""
+    content = (
+        "RUN DEBIAN_FRONTEND=noninteractive apt-get -o Dpkg::Options::=--force-confold -y install \\\n"
+        "    'jq' wget >/dev/null; echo install done\n"
+        "RUN apt install -y --no-install-recommends htop | tee log && apt-get purge -y nano\n"
+        "# apt-get install commented-out\n"
+        "RUN apt-get install -t noble-backports \"git\" $EXTRA\n"
+    )
+
+    assert locking.extract_packages_from_dockerfile(content) == ["jq", "wget", "htop", "git"]
+
+
+def test_extract_packages_unbalanced_quote_falls_back():
+    """Lines the shell tokenizer rejects still yield packages."""
+    assert locking.extract_packages_from_dockerfile("RUN apt-get install -y curl && echo 'oops\n") == ["curl"]
+
+
+def test_rewrite_from_digest():
+    """Matching FROM lines are pinned, keeping stage names and other lines."""
+    content = "FROM ubuntu:24.04 AS build\nRUN make\nfrom ubuntu:24.04\nFROM ubuntu:22.04\n"
+
+    assert locking.rewrite_from_digest(content, "ubuntu:24.04", "sha256:abc") == (
+        "FROM ubuntu@sha256:abc AS build\nRUN make\nfrom ubuntu@sha256:abc\nFROM ubuntu:22.04\n"
+    )
+
+
+def test_write_lock_file_roundtrip(tmp_path):
+    """Lock files are written atomically with readable permissions."""
+    lock_path = tmp_path / "packages.lock"
+    bases = {"ubuntu:24.04": {"digest": "sha256:abc", "codename": "noble", "packages": {"curl": "8.5.0"}}}
+
+    locking.write_lock_file(lock_path, bases)
+
+    assert locking.read_all_bases(lock_path) == bases
+    assert lock_path.stat().st_mode & 0o044
+    assert [p.name for p in tmp_path.glob("*packages.lock*")] == ["packages.lock"]
+
+
+def test_find_image_dir(tmp_path):
+    """image.yml is found at the supported depths only."""
+    (tmp_path / "base" / "ubuntu").mkdir(parents=True)
+    (tmp_path / "base" / "ubuntu" / "image.yml").write_text("")
+    (tmp_path / "lang" / "python" / "3").mkdir(parents=True)
+    (tmp_path / "lang" / "python" / "3" / "image.yml").write_text("")
+
+    assert locking._find_image_dir(tmp_path, "base") == tmp_path / "base" / "ubuntu"
+    assert locking._find_image_dir(tmp_path, "python") == tmp_path / "lang" / "python" / "3"
+    assert locking._find_image_dir(tmp_path, "node") is None
+
+
+def test_scan_distro_reads_top_level_distro(tmp_path, monkeypatch):
+    """Nested "distro" keys later in the syft document are ignored."""
+    document = (
+        b'{"artifacts": [], "distro": {"id": "ubuntu", "versionID": "24.04"}, '
+        b'"descriptor": {"configuration": {"distro": {"id": "alpine"}}}}'
+    )
+    monkeypatch.setattr(
+        locking.subprocess, "run",
+        lambda cmd, **kwargs: locking.subprocess.CompletedProcess(cmd, 0, stdout=document),
+    )
+
+    assert locking._scan_distro(tmp_path / "syft", tmp_path / "image.tar") == {
+        "id": "ubuntu",
+        "versionID": "24.04",
+        "versionCodename": None,
+        "name": None,
+    }
+
+
+def test_lock_file_json_copy_used_by_later_processes(tmp_path, monkeypatch):
+    """An unchanged lock file is read from its JSON copy without YAML."""
+    lock_path = tmp_path / "packages.lock"
+    lock_path.write_text("packages:\n  curl: 8.5.0\n")
+
+    assert locking.read_lock_file(lock_path) == {"curl": "8.5.0"}
+
+    # Simulate a new process: empty in-memory cache, YAML unavailable
+    monkeypatch.setattr(locking, "_lock_cache", {})
+    monkeypatch.setattr(locking, "_load_yaml", lambda path: pytest.fail("YAML parsed again"))
+
+    assert locking.read_lock_file(lock_path) == {"curl": "8.5.0"}
+
+
+def test_clear_lookup_cache_forces_fresh_lookups(lookup_cache, monkeypatch):
+    """Cleared entries are fetched again and the file is rewritten."""
+    lookup_cache.write_text('{"packages": {"noble/curl": ["1.0", 9999999999]}}')
+    monkeypatch.setattr(locking, "_http_get", lambda url: b"Package: curl (2.0)")
+
+    assert locking.get_package_version("curl", "noble") == "1.0"
+    locking.clear_lookup_cache()
+    assert locking.get_package_version("curl", "noble") == "2.0"
+
+    locking.save_lookup_cache()
+    assert '"2.0"' in lookup_cache.read_text()